@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class GuestTableAffinity:
+    """
+    Guest x table affinity matrix of a seating plan, kept in sync with it move by move.
+
+    matrix[g, t] is the score guest g exchanges with the guests at table t (both
+    directions, g excluded). The score change of any move or swap follows from it
+    with plain array arithmetic, so whole batches of candidates are scored at once:
+
+    - moving g from table a to table b: matrix[g, b] - matrix[g, a]
+    - swapping g (at a) with h (at b): matrix[g, b] - matrix[g, a]
+      + matrix[h, a] - matrix[h, b] - 2 * pair(g, h)
+
+    Applying a move only updates the two affected columns for the guests the moved
+    guest has a pair score with. The matrix takes num_guests * num_tables * 8 bytes.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.preferences = plan.preferences
+        self.matrix = self.preferences.table_affinity_matrix(plan.assignment, plan.num_tables)
+
+    def current(self, guest_ids):
+        """Affinity of guests with their own table (0 for guests not seated)."""
+        tables = self.plan.assignment[guest_ids]
+        return np.where(tables >= 0, self.matrix[guest_ids, np.maximum(tables, 0)], 0)
+
+    def move_deltas(self, guest_ids, table_ids):
+        """
+        Score changes of moving each guest to the table at the same index.
+
+        Moves that are not possible (guest not seated, already at that table, or
+        table full) get -inf, so they are never selected.
+        """
+        plan = self.plan
+        deltas = (self.matrix[guest_ids, table_ids] - self.current(guest_ids)).astype(np.float64)
+        tables = plan.assignment[guest_ids]
+        invalid = (tables < 0) | (tables == table_ids) | (plan.counts[table_ids] >= plan.table_capacity)
+        deltas[invalid] = -np.inf
+        return deltas
+
+    def swap_deltas(self, guest_ids1, guest_ids2):
+        """
+        Score changes of swapping each guest of guest_ids1 with the guest at the
+        same index of guest_ids2. Guests at the same table (or not seated) get -inf.
+        """
+        assignment = self.plan.assignment
+        tables1 = assignment[guest_ids1]
+        tables2 = assignment[guest_ids2]
+        invalid = (tables1 == tables2) | (tables1 < 0) | (tables2 < 0)
+        tables1 = np.maximum(tables1, 0)
+        tables2 = np.maximum(tables2, 0)
+        matrix = self.matrix
+        deltas = (matrix[guest_ids1, tables2] - matrix[guest_ids1, tables1]
+                  + matrix[guest_ids2, tables1] - matrix[guest_ids2, tables2]
+                  - 2 * self.preferences.pairs(guest_ids1, guest_ids2)).astype(np.float64)
+        deltas[invalid] = -np.inf
+        return deltas
+
+    def _moved(self, guest_id, from_table_idx, to_table_idx):
+        ids, values = self.preferences.pair_row(guest_id)
+        if from_table_idx >= 0:
+            self.matrix[ids, from_table_idx] -= values
+        if to_table_idx >= 0:
+            self.matrix[ids, to_table_idx] += values
+
+    def move(self, guest, to_table_idx):
+        """Moves a guest in the plan and updates the matrix. Returns False if the table is full."""
+        from_table_idx = self.plan.table_of(guest)
+        if not self.plan.move_guest(guest, from_table_idx, to_table_idx):
+            return False
+        self._moved(guest.id, from_table_idx, to_table_idx)
+        return True
+
+    def swap(self, guest1, guest2):
+        """Swaps two guests in the plan and updates the matrix."""
+        table1_idx = self.plan.table_of(guest1)
+        table2_idx = self.plan.table_of(guest2)
+        self.plan.swap(guest1, guest2)
+        self._moved(guest1.id, table1_idx, table2_idx)
+        self._moved(guest2.id, table2_idx, table1_idx)
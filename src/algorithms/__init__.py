@@ -3,4 +3,7 @@ from .hill_climbing import HillClimbing
 from .greedy import Greedy
 from .tabu_search import TabuSearch
 from .geneticAlgorithm import GeneticAlgorithm
-from .k_clustering import KClustering 
\ No newline at end of file
+from .k_clustering import KClustering
+from .vectorized_genetic import VectorizedGeneticAlgorithm
+from .island_genetic import IslandGeneticAlgorithm
+from .parallel_tempering import ParallelTempering
@@ -1,8 +1,47 @@
 import random
+from collections import OrderedDict
+import metrics
 from seating_plan import SeatingPlan
+from preferences import preferences_for
+from budget import Budget
+
+
+class FitnessCache:
+    """
+    Bounded memo of plan scores keyed by SeatingPlan.plan_key().
+
+    The least recently used entry is evicted once maxsize entries are stored, so
+    memory stays flat over long runs. hits and misses count the lookups.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+
+    def get(self, seating_plan):
+        """Score of a plan, from the cache when an equivalent plan was scored before."""
+        key = seating_plan.plan_key()
+        score = self._scores.get(key)
+        if score is not None:
+            self.hits += 1
+            self._scores.move_to_end(key)
+            return score
+        self.misses += 1
+        score = seating_plan.score()
+        self._scores[key] = score
+        if len(self._scores) > self.maxsize:
+            self._scores.popitem(last=False)
+        return score
+
+    def __len__(self):
+        return len(self._scores)
+
 
 class GeneticAlgorithm:
-    def __init__(self, guests, num_tables, table_capacity, population_size=30, generations=50, mutation_rate=0.1, elitism_rate=0.1):
+    def __init__(self, guests, num_tables, table_capacity, population_size=30, generations=50, mutation_rate=0.1, elitism_rate=0.1,
+                 cache_size=4096):
         """
         Initialize the Genetic Algorithm with all necessary parameters.
 
@@ -14,6 +53,7 @@ class GeneticAlgorithm:
         - generations: Number of generations to evolve.
         - mutation_rate: Probability of mutation occurring.
         - elitism_rate: Proportion of best solutions carried forward unchanged.
+        - cache_size: Maximum number of plan scores kept in the fitness cache.
         """
         self.guests = guests
         self.num_tables = num_tables
@@ -22,7 +62,7 @@ class GeneticAlgorithm:
         self.generations = generations
         self.mutation_rate = mutation_rate
         self.elitism_rate = elitism_rate
-        self.fitness_cache = {}  # Memoization for fitness function to avoid recalculating
+        self.fitness_cache = FitnessCache(cache_size)  # Memoization for fitness function to avoid recalculating
 
     def initialize_population(self):
         """Create the initial population with random seating plans."""
@@ -30,10 +70,7 @@ class GeneticAlgorithm:
 
     def fitness(self, seating_plan):
         """Compute and cache the fitness score of a seating plan."""
-        plan_key = tuple(tuple(table.guests) for table in seating_plan.tables)
-        if plan_key not in self.fitness_cache:
-            self.fitness_cache[plan_key] = seating_plan.score()
-        return self.fitness_cache[plan_key]
+        return self.fitness_cache.get(seating_plan)
 
     def selection(self, population, fitness_scores):
         """
@@ -74,36 +111,56 @@ class GeneticAlgorithm:
                 seating_plan.tables[table1].add_guest(guest2)
                 seating_plan.tables[table2].add_guest(guest1)
 
-    def run(self):
-        """Main loop for running the Genetic Algorithm and returning the best solution."""
-        population = self.initialize_population()
-        best_plan = None
-        best_score = float('-inf')
+    @metrics.timed('genetic.run')
+    def run(self, budget=None):
+        """
+        Main loop for running the Genetic Algorithm and returning the best solution.
 
-        for gen in range(self.generations):
-            # Calculate fitness scores for the current population
-            fitness_scores = [self.fitness(plan) for plan in population]
+        Parameters:
+        - budget: Budget deciding when to stop, counted in generations (self.generations by default).
+        """
+        budget = (budget or Budget(max_iterations=self.generations)).start(preferences_for(self.guests), self.table_capacity)
+        self.budget = budget
+        hits, misses = self.fitness_cache.hits, self.fitness_cache.misses
 
-            # Track the best solution found so far
-            max_fitness_idx = fitness_scores.index(max(fitness_scores))
-            if fitness_scores[max_fitness_idx] > best_score:
-                best_plan = population[max_fitness_idx]
-                best_score = fitness_scores[max_fitness_idx]
+        # Score the initial population first, so a budget already spent returns its best plan
+        population = self.initialize_population()
+        with metrics.timer('genetic.fitness'):
+            fitness_scores = [self.fitness(plan) for plan in population]
+        evaluated = len(population)
+        best_score = max(fitness_scores)
+        best_plan = population[fitness_scores.index(best_score)]
 
+        gen = 0
+        while not budget.should_stop(gen, best_score):
+            gen += 1
             # Apply elitism: carry forward a fraction of the best individuals
             num_elites = max(1, int(self.elitism_rate * self.population_size))
             elites = sorted(zip(population, fitness_scores), key=lambda x: x[1], reverse=True)[:num_elites]
             next_generation = [elite[0] for elite in elites]
 
-            # Generate remaining individuals for the next generation
-            while len(next_generation) < self.population_size:
-                parent1 = self.selection(population, fitness_scores)
-                parent2 = self.selection(population, fitness_scores)
-                child = self.crossover(parent1, parent2)
-                self.mutation(child)
-                next_generation.append(child)
+            # Generate remaining individuals for the next generation, cut short by the deadline
+            with metrics.timer('genetic.reproduction'):
+                while len(next_generation) < self.population_size and budget.remaining() != 0:
+                    parent1 = self.selection(population, fitness_scores)
+                    parent2 = self.selection(population, fitness_scores)
+                    child = self.crossover(parent1, parent2)
+                    self.mutation(child)
+                    next_generation.append(child)
 
-            # Move to next generation
+            # Move to next generation and calculate its fitness scores
             population = next_generation
+            with metrics.timer('genetic.fitness'):
+                fitness_scores = [self.fitness(plan) for plan in population]
+            evaluated += len(population)
+
+            # Track the best solution found so far
+            max_fitness_idx = fitness_scores.index(max(fitness_scores))
+            if fitness_scores[max_fitness_idx] > best_score:
+                best_plan = population[max_fitness_idx]
+                best_score = fitness_scores[max_fitness_idx]
 
+        metrics.count('fitness_evaluations', evaluated)
+        metrics.count('cache_hits', self.fitness_cache.hits - hits)
+        metrics.count('cache_misses', self.fitness_cache.misses - misses)
         return best_plan, best_score
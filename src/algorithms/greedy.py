@@ -1,49 +1,283 @@
-from seating_plan import Table
+import heapq
+import numpy as np
+import metrics
+from seating_plan import Table, SeatingPlan
+from preferences import preferences_for
+from budget import Budget
+
+ORDERINGS = ('regret', 'preference')
+
+# Table of a ranking entry that stands for "any open table the guest has no affinity with"
+NO_AFFINITY = -1
 
 # Define the Greedy class, which assigns guests to tables using a greedy heuristic
 class Greedy:
-    def __init__(self, guests, num_tables, table_capacity):
+    def __init__(self, guests, num_tables, table_capacity, ordering='regret'):
+        """
+        Greedy construction: seats guests one at a time at the table they have the
+        highest affinity with (both directions of every preference with the guests
+        already seated there).
+
+        Affinities are sparse: a guest only has an entry for the tables where one of
+        the guests they share a pair score with sits, every other table is worth 0 to
+        them. Seating a guest updates the entries of those neighbours only, and so are
+        the best and second best open table of every guest kept for the regrets, so a
+        run costs about O(preferences + guests log guests) instead of growing with
+        guests x tables.
+
+        Parameters:
+        - guests: List of all guests.
+        - num_tables: Total number of tables.
+        - table_capacity: Maximum number of guests per table.
+        - ordering: Which guest is seated next. 'regret' picks the guest with the
+          largest gap between their best and second best table, so guests that stand
+          to lose the most are placed before their table fills up; 'preference' seats
+          guests by decreasing sum of their top 3 preferences.
+        """
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown ordering '{ordering}', expected one of {', '.join(ORDERINGS)}.")
         # Create a list of Table objects based on the given number of tables and capacity
         self.tables = [Table(table_capacity) for _ in range(num_tables)]
-        # Store the list of guests
+        self.num_tables = num_tables
+        self.table_capacity = table_capacity
+        self.ordering = ordering
+        # Store the list of guests and the preference backend (dense or sparse) built for it;
+        # guests are looked up by id through the backend, whatever the order of the list
         self.guest_list = guests
+        self.preferences = preferences_for(guests)
+        self.guests_by_id = self.preferences.guests
 
-    # Main method that executes the seating algorithm
-    def run(self):
-        # Define a helper function that calculates a preference score for a guest
-        # based on the sum of their top-k preferences (default k=3)
-        def preference_score(guest, k=3):
-            return sum(sorted(guest.preferences.values(), reverse=True)[:k])
-        
-        # Sort guests by their preference score (and by name as a tiebreaker)
-        # Higher scores come first
-        sorted_guests = sorted(self.guest_list, key=lambda x: (preference_score(x), x.name), reverse=True)
-        
-        # Distribute the first few guests across tables to avoid empty tables
-        for i, guest in enumerate(sorted_guests[:len(self.tables)]):
-            self.tables[i].add_guest(guest)
-        
-        # Assign the remaining guests using a heuristic
-        for guest in sorted_guests[len(self.tables):]:
-            best_table = None
-            best_score = float('-inf')
-            
-            # Evaluate each table to find where the guest would fit best
-            for table in self.tables:
-                if not table.is_full():
-                    # Compute the sum of this guest's preferences for people already at the table
-                    score = sum(guest.get_preference(other) for other in table.guests)
-                    # Update the best table if this one has a higher score
-                    if score > best_score:
-                        best_table = table
-                        best_score = score
-            
-            # If a suitable table was found, add the guest to it
-            if best_table:
-                best_table.add_guest(guest)
+    def preference_score(self, guest_id, k=3):
+        """Sum of a guest's top-k preferences."""
+        _, scores = self.preferences.row(guest_id)
+        return sum(sorted(scores.tolist(), reverse=True)[:k])
+
+    def _reset(self):
+        num_guests = len(self.preferences)
+        if num_guests > self.num_tables * self.table_capacity:
+            raise ValueError("All tables are full before all guests were seated. Consider increasing table capacity or number of tables.")
+        self.tables = [Table(self.table_capacity) for _ in range(self.num_tables)]
+        self.members = [[] for _ in range(self.num_tables)]
+        self.counts = [0] * self.num_tables
+        # Open tables by number of seated guests, to find the emptiest one quickly
+        self.by_count = [set() for _ in range(self.table_capacity)]
+        self.by_count[0].update(range(self.num_tables))
+        self.open_tables = self.num_tables
+        self.seated = np.zeros(num_guests, dtype=bool)
+        # affinities[guest_id][table_idx] for the tables where the guest has a seated neighbour
+        self.affinities = [{} for _ in range(num_guests)]
+        # Best and second best open table of every guest and their affinities, for the
+        # regrets (NO_AFFINITY entries count 0). touched_open counts the open tables a
+        # guest has an entry for, and unknown the NO_AFFINITY entries of their ranking,
+        # which the open tables without an entry must be able to cover
+        zero_entries = min(2, self.num_tables)
+        self.first = [0] * num_guests
+        self.second = [0] * num_guests
+        self.first_table = [NO_AFFINITY] * num_guests
+        self.second_table = [NO_AFFINITY] * num_guests
+        self.touched_open = [0] * num_guests
+        self.unknown = [zero_entries] * num_guests
+        self.max_touched = 0
+
+    def is_open(self, table_idx):
+        return self.counts[table_idx] < self.table_capacity
+
+    def best_table(self, guest_id):
+        """
+        Table with a free seat this guest has the highest affinity with. Ties go to the
+        table with the most free seats, so guests without preferences spread out and
+        leave room for the guests that have some.
+        """
+        affinities = self.affinities[guest_id]
+        scale = self.table_capacity + 1
+        best_key, best = -np.inf, None
+        for table_idx, value in affinities.items():
+            free = self.table_capacity - self.counts[table_idx]
+            key = value + free / scale
+            if free > 0 and (key > best_key or (key == best_key and table_idx < best)):
+                best_key, best = key, table_idx
+        # Tables without an entry are worth 0: only the emptiest of them can win
+        for count, tables in enumerate(self.by_count):
+            empty = next((table_idx for table_idx in tables if table_idx not in affinities), None)
+            if empty is not None:
+                if (self.table_capacity - count) / scale > best_key:
+                    best = empty
+                break
+        return best
+
+    def _rank(self, guest_id):
+        """Recomputes a guest's best and second best open table from their affinity entries."""
+        entries = [(value, table_idx) for table_idx, value in self.affinities[guest_id].items() if self.is_open(table_idx)]
+        self.touched_open[guest_id] = len(entries)
+        entries.extend([(0, NO_AFFINITY)] * min(2, self.open_tables - len(entries)))
+        top = heapq.nlargest(2, entries)
+        if len(top) < 2:
+            # A single open table: regrets no longer matter
+            top.append(top[0] if top else (0, NO_AFFINITY))
+        (self.first[guest_id], self.first_table[guest_id]), (self.second[guest_id], self.second_table[guest_id]) = top
+        self.unknown[guest_id] = (self.first_table[guest_id] == NO_AFFINITY) + (self.second_table[guest_id] == NO_AFFINITY)
+
+    def regret(self, guest_id):
+        """Gap between a guest's best and second best table with a free seat (inf with one table left)."""
+        if self.open_tables < 2:
+            return np.inf
+        return self.first[guest_id] - self.second[guest_id]
+
+    def _update_rank(self, guest_id, table_idx, change, new_entry):
+        """
+        Updates a guest's best and second best table after their affinity with one
+        open table changed by `change`. Only a drop of the best or second best table,
+        or running out of open tables without an entry, needs a rescan of the guest's
+        entries.
+        """
+        if new_entry:
+            self.touched_open[guest_id] += 1
+            self.max_touched = max(self.max_touched, self.touched_open[guest_id])
+            if self.unknown[guest_id] > self.open_tables - self.touched_open[guest_id]:
+                self._rank(guest_id)
+                return
+        value = self.affinities[guest_id][table_idx]
+        first, second = self.first[guest_id], self.second[guest_id]
+        if table_idx == self.first_table[guest_id]:
+            if value >= second:
+                self.first[guest_id] = value
+            else:
+                self._rank(guest_id)
+        elif table_idx == self.second_table[guest_id]:
+            if value > first:
+                self.first_table[guest_id], self.second_table[guest_id] = table_idx, self.first_table[guest_id]
+                self.first[guest_id], self.second[guest_id] = value, first
+            elif change >= 0:
+                self.second[guest_id] = value
+            else:
+                self._rank(guest_id)
+        elif value > first:
+            self.unknown[guest_id] -= self.second_table[guest_id] == NO_AFFINITY
+            self.second_table[guest_id], self.second[guest_id] = self.first_table[guest_id], first
+            self.first_table[guest_id], self.first[guest_id] = table_idx, value
+        elif value > second:
+            self.unknown[guest_id] -= self.second_table[guest_id] == NO_AFFINITY
+            self.second_table[guest_id], self.second[guest_id] = table_idx, value
+
+    def _close(self, table_idx):
+        """
+        Reranks the guests a table that just filled up affects: those that ranked it
+        first or second, and those left with fewer open tables without an entry than
+        their ranking counts on.
+
+        Returns:
+            set: Ids of the reranked guests
+        """
+        affected, seen = set(), set()
+        for member_id in self.members[table_idx]:
+            ids, _ = self.preferences.pair_row(member_id)
+            for other_id in ids.tolist():
+                if self.seated[other_id] or other_id in seen:
+                    continue
+                seen.add(other_id)
+                # Every waiting neighbour of its guests has an entry for the table
+                self.touched_open[other_id] -= 1
+                if self.first_table[other_id] == table_idx or self.second_table[other_id] == table_idx:
+                    affected.add(other_id)
+        # Only guests with an entry for almost every open table can run out of tables without one
+        if self.open_tables <= self.max_touched + 2:
+            waiting = np.flatnonzero(~self.seated).tolist()
+            affected.update(guest_id for guest_id in waiting
+                            if self.unknown[guest_id] > self.open_tables - self.touched_open[guest_id])
+        for guest_id in affected:
+            self._rank(guest_id)
+        return affected
+
+    def seat(self, guest_id, table_idx):
+        """
+        Seats a guest and adds their pair scores to the affinities of their waiting
+        neighbours with that table.
+
+        Returns:
+            list: (neighbour id, change, whether it is the neighbour's first entry for the table)
+        """
+        self.tables[table_idx].add_guest(self.guests_by_id[guest_id])
+        self.members[table_idx].append(guest_id)
+        self.seated[guest_id] = True
+        self.by_count[self.counts[table_idx]].discard(table_idx)
+        self.counts[table_idx] += 1
+        if self.is_open(table_idx):
+            self.by_count[self.counts[table_idx]].add(table_idx)
+        else:
+            self.open_tables -= 1
+
+        changes = []
+        ids, values = self.preferences.pair_row(guest_id)
+        for other_id, change in zip(ids.tolist(), values.tolist()):
+            if self.seated[other_id]:
+                continue
+            affinities = self.affinities[other_id]
+            new_entry = table_idx not in affinities
+            affinities[table_idx] = affinities.get(table_idx, 0) + change
+            changes.append((other_id, change, new_entry))
+        return changes
+
+    def _seat_guests(self):
+        """Seats every guest, in the order given by self.ordering."""
+        self._reset()
+        num_guests = len(self.preferences)
+        # Higher preference scores come first (and by name as a tiebreaker)
+        priority = [(self.preference_score(guest_id), guest.name) for guest_id, guest in enumerate(self.guests_by_id)]
+
+        if self.ordering == 'preference':
+            for guest_id in sorted(range(num_guests), key=priority.__getitem__, reverse=True):
+                self.seat(guest_id, self.best_table(guest_id))
+            return
+
+        # Max-heap on (regret, preference score). A guest gets a new entry every time
+        # their regret changes, so an entry whose regret is not the guest's current one
+        # (higher or lower) is outdated and skipped
+        heap = [(-self.regret(guest_id), -priority[guest_id][0], guest_id) for guest_id in range(num_guests)]
+        heapq.heapify(heap)
+        while heap:
+            key, tiebreak, guest_id = heapq.heappop(heap)
+            if self.seated[guest_id] or (self.open_tables >= 2 and -key != self.regret(guest_id)):
+                continue
+
+            table_idx = self.best_table(guest_id)
+            changes = self.seat(guest_id, table_idx)
+            if self.open_tables < 2:
+                # Regrets are all inf from now on: the remaining entries stay valid
+                continue
+            if not self.is_open(table_idx):
+                for other_id, _, new_entry in changes:
+                    self.touched_open[other_id] += new_entry
+                changed = self._close(table_idx)
             else:
-                # If all tables are full (should not happen), raise an error
-                raise ValueError("All tables are full before all guests were seated. Consider increasing table capacity or number of tables.")
-        
-        # Return the final list of tables with seated guests
-        return self.tables
\ No newline at end of file
+                # Only the guests with a pair score with this one have a new affinity with the table
+                changed = []
+                for other_id, change, new_entry in changes:
+                    before = self.regret(other_id)
+                    self._update_rank(other_id, table_idx, change, new_entry)
+                    if self.regret(other_id) != before:
+                        changed.append(other_id)
+            for other_id in changed:
+                heapq.heappush(heap, (-self.regret(other_id), -priority[other_id][0], other_id))
+
+    # Main method that executes the seating algorithm
+    @metrics.timed('greedy.run')
+    def run(self, budget=None):
+        """
+        Seats every guest in a single pass and returns (best_plan, best_score).
+
+        The pass counts as one iteration of the budget (see Budget): there is nothing
+        to stop halfway, but the running budget in self.budget still records the
+        score and its optimality gap like the other optimizers'.
+        """
+        budget = (budget or Budget(max_iterations=1)).start(self.preferences, self.table_capacity)
+        self.budget = budget
+        self._seat_guests()
+        metrics.count('placements', len(self.preferences))
+
+        assignment = np.full(len(self.preferences), -1, dtype=np.int32)
+        for table_idx, guest_ids in enumerate(self.members):
+            assignment[guest_ids] = table_idx
+        best_plan = SeatingPlan.from_assignment(self.guest_list, assignment, self.num_tables, self.table_capacity)
+        best_score = best_plan.score()
+        budget.should_stop(1, best_score)
+        return best_plan, best_score
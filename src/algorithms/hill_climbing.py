@@ -1,58 +1,66 @@
 import random
-from seating_plan import SeatingPlan, Table
+import metrics
+from budget import Budget
 
 # Define the HillClimbing class which tries to optimize the seating plan using hill climbing
 class HillClimbing:
     def __init__(self, seating_plan, max_iterations=10000):
-        # Initialize with a given seating plan
-        self.current_plan = seating_plan
-        self.best_plan = seating_plan
+        # Initialize with a copy of the given seating plan, since moves are applied in place
+        self.current_plan = seating_plan.copy()
+        self.best_plan = self.current_plan
         # Score the initial plan
         self.current_score = seating_plan.score()
         self.best_score = self.current_score
         # Set a limit for how many iterations the algorithm will run
         self.max_iterations = max_iterations
 
-    # The main optimization loop
-    def run(self):
-        for _ in range(self.max_iterations):
-            # Generate a "neighbor" plan by making a small change (swapping guests)
-            new_plan = self._generate_neighbor()
-            new_score = new_plan.score()
+    # The main optimization loop; the budget (see Budget) defaults to max_iterations swaps tried
+    @metrics.timed('hill_climbing.run')
+    def run(self, budget=None):
+        budget = (budget or Budget(max_iterations=self.max_iterations)).start(
+            self.current_plan.preferences, self.current_plan.table_capacity)
+        self.budget = budget
+        iteration = evaluated = accepted = 0
+        while not budget.should_stop(iteration, self.best_score):
+            iteration += 1
+            # Pick a "neighbor" by choosing a small change (swapping two guests)
+            move = self._generate_neighbor()
+            if move is None:
+                continue
+            evaluated += 1
+            guest1, guest2 = move
+            # Only the two affected tables are needed to know how the score would change
+            delta = self.current_plan.delta_swap(guest1, guest2)
 
             # If the new plan is better, move to it
-            if new_score > self.current_score:
-                self.current_plan = new_plan
-                self.current_score = new_score
+            if delta > 0:
+                accepted += 1
+                self.current_plan.swap(guest1, guest2)
+                self.current_score += delta
 
-                # If it's the best so far, update the best plan
-                if new_score > self.best_score:
-                    self.best_plan = new_plan
-                    self.best_score = new_score
+                # Hill climbing only accepts improvements, so the current plan is always the best
+                self.best_plan = self.current_plan
+                self.best_score = self.current_score
+
+        metrics.count('delta_evaluations', evaluated)
+        metrics.count('accepted_moves', accepted)
+        metrics.count('rejected_moves', evaluated - accepted)
 
         # Return the best plan found and its score
         return self.best_plan, self.best_score
 
     def _generate_neighbor(self):
         """
-        Generates a neighboring solution by swapping two guests between two different tables.
+        Picks a neighboring solution as a swap of two guests between two different tables.
         This is the "small step" used by hill climbing to explore new possibilities.
+
+        Returns:
+            tuple: The two guests to swap, or None if one of the chosen tables is empty
         """
-        # Create a deep copy of the current seating plan
-        new_plan = SeatingPlan(
-            self.current_plan.guest_list,
-            len(self.current_plan.tables),
-            self.current_plan.tables[0].capacity
-        )
-
-        # Recreate tables and copy the guest assignments from the current plan
-        new_plan.tables = [Table(table.capacity) for table in self.current_plan.tables]
-        for i, table in enumerate(self.current_plan.tables):
-            # Copy guest lists (shallow copy of guest references)
-            new_plan.tables[i].guests = table.guests[:]
-
-        # Randomly pick two different tables and swap a guest between them
-        table1, table2 = random.sample(range(len(new_plan.tables)), 2)
-        new_plan.swap_guests(table1, table2)
-
-        return new_plan
\ No newline at end of file
+        # Randomly pick two different tables and a guest from each
+        table1, table2 = random.sample(range(len(self.current_plan.tables)), 2)
+        guests1 = self.current_plan.tables[table1].guests
+        guests2 = self.current_plan.tables[table2].guests
+        if not guests1 or not guests2:
+            return None
+        return random.choice(guests1), random.choice(guests2)
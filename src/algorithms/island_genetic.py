@@ -0,0 +1,202 @@
+import os
+import random
+import multiprocessing
+import numpy as np
+import metrics
+from seating_plan import SeatingPlan
+from preferences import GuestList, preferences_for
+from shared_preferences import SharedInstance, attach
+from budget import Budget
+from .vectorized_genetic import VectorizedGeneticAlgorithm
+
+TOPOLOGIES = ('ring', 'fully_connected', 'random')
+
+# Engines already built in this worker process, by (instance token, settings)
+_engines = {}
+
+
+def _evolve_island(task):
+    """
+    Worker: evolves one island for one epoch.
+
+    Args:
+        task: (handle, settings, population, fitness_scores, seed, generations, deadline)
+              where handle is a SharedInstanceHandle, settings the VectorizedGeneticAlgorithm
+              arguments and deadline an absolute time that ends the epoch early (or None)
+
+    Returns:
+        (population, fitness_scores) after the epoch
+    """
+    handle, settings, population, fitness_scores, seed, generations, deadline = task
+    key = (handle.token, tuple(sorted(settings.items())))
+    engine = _engines.get(key)
+    if engine is None:
+        engine = VectorizedGeneticAlgorithm(attach(handle), **settings)
+        _engines[key] = engine
+    engine.rng = np.random.default_rng(seed)
+    budget = None if deadline is None else Budget(deadline=deadline)
+    return engine.evolve(population, generations, budget, fitness_scores)
+
+
+class IslandGeneticAlgorithm:
+    def __init__(self, guests, num_tables, table_capacity, num_islands=None, island_population=500, generations=200,
+                 migration_interval=20, migration_size=5, topology='ring', processes=None, mutation_rate=0.1,
+                 elitism_rate=0.1, tournament_size=3):
+        """
+        Island-model Genetic Algorithm: several populations evolve in parallel in a
+        process pool, and every migration_interval generations the best individuals
+        of each island are copied to its neighbors, replacing their worst ones.
+
+        Workers read the preferences from shared memory (see shared_preferences), so
+        only the island populations travel between processes.
+
+        Parameters:
+        - guests: List of all guests.
+        - num_tables: Total number of tables.
+        - table_capacity: Maximum number of guests per table.
+        - num_islands: Number of sub-populations (defaults to the number of CPUs).
+        - island_population: Number of solutions on each island.
+        - generations: Number of generations every island evolves.
+        - migration_interval: Generations between two migrations.
+        - migration_size: Best individuals each island sends per migration.
+        - topology: Who receives an island's migrants: 'ring' (the next island),
+          'fully_connected' (every other island) or 'random' (one random other island
+          per migration).
+        - processes: Size of the process pool (defaults to num_islands, capped at the
+          number of CPUs); 1 runs every island in this process.
+        - mutation_rate, elitism_rate, tournament_size: As in VectorizedGeneticAlgorithm.
+        """
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown topology '{topology}', expected one of {', '.join(TOPOLOGIES)}.")
+        if not isinstance(guests, GuestList):
+            guests = GuestList(guests, preferences_for(guests))
+        self.guests = guests
+        self.num_tables = num_tables
+        self.table_capacity = table_capacity
+        self.num_islands = num_islands or os.cpu_count() or 1
+        self.generations = generations
+        self.migration_interval = max(1, migration_interval)
+        self.migration_size = min(migration_size, island_population)
+        self.topology = topology
+        self.processes = processes or min(self.num_islands, os.cpu_count() or 1)
+        self.settings = {
+            'num_tables': num_tables,
+            'table_capacity': table_capacity,
+            'population_size': island_population,
+            'mutation_rate': mutation_rate,
+            'elitism_rate': elitism_rate,
+            'tournament_size': tournament_size,
+        }
+        # Also checks that every guest has a seat
+        self.engine = VectorizedGeneticAlgorithm(guests, **self.settings)
+        self.island_stats = []  # Filled by run(), one dict per island
+
+    def neighbors(self, island):
+        """Islands that receive the migrants of an island."""
+        if self.num_islands < 2:
+            return []
+        if self.topology == 'ring':
+            return [(island + 1) % self.num_islands]
+        if self.topology == 'fully_connected':
+            return [other for other in range(self.num_islands) if other != island]
+        return [random.choice([other for other in range(self.num_islands) if other != island])]
+
+    def migrate(self, populations, fitness_scores):
+        """
+        Copies the best individuals of every island over the worst ones of its
+        neighbors, in place. Returns how many migrants each island received.
+        """
+        # Pick every island's migrants before any island changes
+        migrants = []
+        for population, scores in zip(populations, fitness_scores):
+            best = np.argsort(scores)[::-1][:self.migration_size]
+            migrants.append((population[best].copy(), scores[best].copy()))
+
+        received = [0] * self.num_islands
+        for island, (individuals, scores) in enumerate(migrants):
+            for target in self.neighbors(island):
+                worst = np.argsort(fitness_scores[target])[:len(individuals)]
+                populations[target][worst] = individuals
+                fitness_scores[target][worst] = scores
+                received[target] += len(individuals)
+        return received
+
+    def _evolve_all(self, pool, handle, populations, fitness_scores, generations, deadline):
+        """Evolves every island for one epoch, in the pool if there is one."""
+        seeds = [random.getrandbits(64) for _ in populations]
+        if pool:
+            tasks = [(handle, self.settings, population, scores, seed, generations, deadline)
+                     for population, scores, seed in zip(populations, fitness_scores, seeds)]
+            return pool.map(_evolve_island, tasks)
+        results = []
+        for population, scores, seed in zip(populations, fitness_scores, seeds):
+            self.engine.rng = np.random.default_rng(seed)
+            budget = None if deadline is None else Budget(deadline=deadline)
+            results.append(self.engine.evolve(population, generations, budget, scores))
+        return results
+
+    @metrics.timed('island_genetic.run')
+    def run(self, budget=None):
+        """
+        Runs every island and returns the best plan found on any of them.
+
+        The budget (see Budget) counts generations and defaults to self.generations.
+        It is checked between epochs; a deadline also cuts the running epoch short.
+
+        Per-island statistics are left in island_stats: best score, mean score of the
+        final population, best score after every epoch and migrants received.
+        """
+        budget = (budget or Budget(max_iterations=self.generations)).start(self.guests.preferences, self.table_capacity)
+        self.budget = budget
+        # Islands seeded once the deadline passed keep a single chunk of individuals
+        seeded = [self.engine.seed_population(budget) for _ in range(self.num_islands)]
+        populations = [population for population, _ in seeded]
+        fitness_scores = [scores for _, scores in seeded]
+        history = [[] for _ in range(self.num_islands)]
+        received = [0] * self.num_islands
+
+        shared = pool = None
+        if self.processes > 1:
+            shared = SharedInstance(self.guests)
+            pool = multiprocessing.Pool(self.processes)
+        try:
+            done = 0
+            while not budget.should_stop(done, max(int(scores.max()) for scores in fitness_scores)):
+                epoch = self.migration_interval
+                if budget.max_iterations is not None:
+                    epoch = min(epoch, budget.max_iterations - done)
+                with metrics.timer('island_genetic.epoch'):
+                    results = self._evolve_all(pool, shared and shared.handle, populations, fitness_scores, epoch,
+                                               budget.deadline)
+                populations = [population for population, _ in results]
+                fitness_scores = [scores for _, scores in results]
+                done += epoch
+                for island, scores in enumerate(fitness_scores):
+                    history[island].append(int(scores.max()))
+
+                if budget.max_iterations is None or done < budget.max_iterations:
+                    with metrics.timer('island_genetic.migration'):
+                        for island, count in enumerate(self.migrate(populations, fitness_scores)):
+                            received[island] += count
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+                shared.close()
+
+        self.island_stats = [
+            {
+                'island': island,
+                'best_score': int(scores.max()),
+                'mean_score': float(scores.mean()),
+                'best_by_epoch': history[island],
+                'migrants_received': received[island],
+            }
+            for island, scores in enumerate(fitness_scores)
+        ]
+
+        best_island = int(np.argmax([scores.max() for scores in fitness_scores]))
+        best_idx = int(np.argmax(fitness_scores[best_island]))
+        best_plan = SeatingPlan.from_assignment(
+            self.guests, populations[best_island][best_idx], self.num_tables, self.table_capacity)
+        return best_plan, int(fitness_scores[best_island][best_idx])
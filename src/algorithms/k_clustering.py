@@ -1,111 +1,191 @@
+import heapq
 import random
-import time  # Import time for measuring execution time
-from seating_plan import SeatingPlan, Table
+from itertools import chain
+import numpy as np
+import metrics
+from seating_plan import SeatingPlan
+from preferences import GuestList, preferences_for
+from budget import Budget
+
+MASK64 = (1 << 64) - 1
+
+# Guests ranked, or queue entries handled, between two checks of a budget's deadline
+DEADLINE_CHECK_INTERVAL = 1024
+
+
+def _tie_break(guest_id, table_idx, salt):
+    """Pseudo-random fraction in [0, 0.5) for a (guest, table) couple, hashed instead of stored."""
+    x = (guest_id * 0x9E3779B97F4A7C15 + table_idx * 0xC2B2AE3D27D4EB4F + salt) & MASK64
+    x = ((x ^ (x >> 31)) * 0xBF58476D1CE4E5B9) & MASK64
+    return (x ^ (x >> 29)) / 2.0 ** 65
+
 
 # This class implements a K-Means-style clustering algorithm adapted for seating guests
 class KClustering:
     def __init__(self, guests, num_tables, table_capacity, max_iterations=100):
+        if not isinstance(guests, GuestList):
+            guests = GuestList(guests, preferences_for(guests))
         self.guests = guests
+        self.preferences = guests.preferences
         self.num_tables = num_tables
         self.table_capacity = table_capacity
         self.max_iterations = max_iterations
+        # Seeded from the random module so random.seed() still makes runs repeatable
+        self.rng = np.random.default_rng(random.getrandbits(64))
 
     def initialize_random_tables(self):
-        """Randomly assign guests to tables to start the clustering process."""
-        tables = [Table(self.table_capacity) for _ in range(self.num_tables)]
-        shuffled_guests = self.guests[:]
-        random.shuffle(shuffled_guests)
-
-        # Assign each guest to a random table with available space
-        for guest in shuffled_guests:
-            available_tables = [table for table in tables if not table.is_full()]
-            if available_tables:
-                random.choice(available_tables).add_guest(guest)
+        """Randomly assign guests to tables to start the clustering process. Returns the SeatingPlan."""
+        return SeatingPlan(self.guests, self.num_tables, self.table_capacity)
 
-        return tables
-
-    def initialize_centroids(self):
-        """Randomly select guests to act as initial centroids (representative of a table)."""
-        return random.sample(self.guests, self.num_tables)
-
-    def assign_guests_to_tables(self, centroids):
+    def table_affinities(self, assignment):
+        """
+        Affinity of every guest with every table as it is currently composed: the
+        whole table acts as the cluster's centroid. Affinities are sparse, as a list
+        indexed by guest id of {table index: affinity} dicts holding the tables where
+        one of the guests they share a pair score with sits; every other table is
+        worth 0 to them.
         """
-        Assign each guest to the table whose centroid they prefer most,
-        without exceeding table capacities.
+        where = assignment.tolist()
+        affinities = []
+        for guest_id in range(len(where)):
+            ids, values = self.preferences.pair_row(guest_id)
+            row = {}
+            for other_id, value in zip(ids.tolist(), values.tolist()):
+                table_idx = where[other_id]
+                row[table_idx] = row.get(table_idx, 0) + value
+            affinities.append(row)
+        return affinities
+
+    def assign_guests_to_tables(self, assignment, budget=None):
         """
-        tables = [Table(self.table_capacity) for _ in range(self.num_tables)]
-        unassigned_guests = []
-
-        for guest in self.guests:
-            # Rank centroids by how much this guest prefers them
-            preferences = [
-                (idx, guest.get_preference(centroids[idx]))
-                for idx in range(len(centroids))
-            ]
-            preferences.sort(key=lambda x: -x[1])  # Descending order
-
-            # Try to assign the guest to their most preferred available table
-            assigned = False
-            for idx, _ in preferences:
-                if not tables[idx].is_full():
-                    tables[idx].add_guest(guest)
-                    assigned = True
-                    break
-
-            # If all preferred tables are full, hold for later assignment
-            if not assigned:
-                unassigned_guests.append(guest)
-
-        # Add remaining guests to any available table
-        for guest in unassigned_guests:
-            for table in tables:
-                if not table.is_full():
-                    table.add_guest(guest)
-                    break
-
-        return tables
-
-    def calculate_new_centroids(self, tables):
+        Reassign every guest to the table they have the highest affinity with, without
+        exceeding table capacities.
+
+        The affinities of all guests with the tables their neighbours sit at are
+        computed first (see table_affinities), then (guest, table) candidates come out
+        of a priority queue in decreasing affinity, so the guests most attached to a
+        table claim its seats first. A guest that changes table updates the affinities
+        of the guests they have a pair score with, so the guests still waiting follow
+        them instead of swapping places with them. Ties go to the guest's current
+        table, then at random. Nothing is kept per guest and table, so a round costs
+        about O(preferences + guests log guests) in time and memory.
+
+        A started Budget, if given, is checked every DEADLINE_CHECK_INTERVAL seats.
+
+        Returns:
+        - New guest -> table array, or None if the budget's deadline passed first.
         """
-        For each table, select the guest who has the highest average preference
-        for the others at that table to act as the new centroid.
+        num_guests, num_tables, capacity = len(assignment), self.num_tables, self.table_capacity
+        previous = assignment.tolist()
+        affinities = self.table_affinities(assignment)
+        salt = int(self.rng.integers(1 << 62))
+        pick = random.Random(salt).randrange
+
+        # Affinities are integers: staying adds 0.5 and a hashed fraction below 0.5 breaks
+        # the remaining ties, so neither ever outweighs a real difference in affinity
+        def key(guest_id, table_idx):
+            bonus = _tie_break(guest_id, table_idx, salt) + (0.5 if table_idx == previous[guest_id] else 0.0)
+            return -(affinities[guest_id].get(table_idx, 0) + bonus)
+
+        counts = [0] * num_tables
+        open_tables = list(range(num_tables))   # Tables with a free seat, in any order
+        slot = list(range(num_tables))          # Index of each open table in open_tables
+
+        def best_table(guest_id):
+            """Open table with the lowest key for this guest."""
+            row = affinities[guest_id]
+            best_key, best = np.inf, None
+            for table_idx in row.keys() | {previous[guest_id]}:
+                if counts[table_idx] < capacity:
+                    table_key = key(guest_id, table_idx)
+                    if table_key < best_key:
+                        best_key, best = table_key, table_idx
+            if best_key > -0.5:
+                # The open tables without an entry are worth 0 and only differ by their
+                # tie-break: a random one of them stands for all (a few random picks,
+                # then a scan for guests with an entry for most open tables)
+                sampled = (open_tables[pick(len(open_tables))] for _ in range(8))
+                for table_idx in chain(sampled, open_tables):
+                    if table_idx not in row and table_idx != previous[guest_id]:
+                        if key(guest_id, table_idx) < best_key:
+                            best = table_idx
+                        break
+            return best
+
+        heap = []
+        for guest_id in range(num_guests):
+            if budget is not None and guest_id % DEADLINE_CHECK_INTERVAL == 0 and budget.remaining() == 0:
+                return None
+            table_idx = best_table(guest_id)
+            heap.append((key(guest_id, table_idx), guest_id, table_idx))
+        heapq.heapify(heap)
+
+        new_assignment = np.full(num_guests, -1, dtype=np.int32)
+        pops = 0
+        while heap:
+            pops += 1
+            if budget is not None and pops % DEADLINE_CHECK_INTERVAL == 0 and budget.remaining() == 0:
+                return None
+            priority, guest_id, table_idx = heapq.heappop(heap)
+            if new_assignment[guest_id] >= 0:
+                continue
+            if counts[table_idx] >= capacity:
+                # Tables never empty during the reassignment, so go for the best one with a free seat
+                table_idx = best_table(guest_id)
+                heapq.heappush(heap, (key(guest_id, table_idx), guest_id, table_idx))
+                continue
+            if priority != key(guest_id, table_idx):
+                # Stale entry: the affinity changed since it was pushed
+                heapq.heappush(heap, (key(guest_id, table_idx), guest_id, table_idx))
+                continue
+
+            new_assignment[guest_id] = table_idx
+            counts[table_idx] += 1
+            if counts[table_idx] == capacity:
+                # Swap-remove the table from the open ones
+                last = open_tables.pop()
+                if last != table_idx:
+                    open_tables[slot[table_idx]] = last
+                    slot[last] = slot[table_idx]
+            if table_idx != previous[guest_id]:
+                ids, values = self.preferences.pair_row(guest_id)
+                for other_id, value in zip(ids.tolist(), values.tolist()):
+                    row = affinities[other_id]
+                    row[previous[guest_id]] -= value
+                    row[table_idx] = row.get(table_idx, 0) + value
+                    # Waiting guests that like this one may now prefer its new table
+                    if value > 0 and new_assignment[other_id] < 0:
+                        heapq.heappush(heap, (key(other_id, table_idx), other_id, table_idx))
+        return new_assignment
+
+    @metrics.timed('k_clustering.run')
+    def run(self, budget=None):
         """
-        centroids = []
-        for table in tables:
-            if not table.guests:
-                # Handle empty table by assigning a random guest as the centroid
-                centroids.append(random.choice(self.guests))
-            else:
-                # Find the guest who is most "liked" or compatible with the others
-                centroids.append(
-                    max(
-                        table.guests,
-                        key=lambda guest: sum(
-                            guest.get_preference(other)
-                            for other in table.guests if guest != other
-                        )
-                    )
-                )
-        return centroids
-
-    def run(self):
-        """Run the K-Clustering algorithm to generate an optimized seating plan."""
-        start_time = time.time()  # Start measuring time
-
-        # Step 1: Initialize tables and centroids
-        tables = self.initialize_random_tables()
-        centroids = self.calculate_new_centroids(tables)
-
-        best_plan = None
-        best_score = float('-inf')
-
-        for _ in range(self.max_iterations):
-            # Step 2: Assign guests to the most compatible tables (based on centroids)
-            tables = self.assign_guests_to_tables(centroids)
+        Run the K-Clustering algorithm to generate an optimized seating plan.
+
+        Stops when the tables no longer change or the budget (see Budget, max_iterations
+        rounds by default) runs out, whichever comes first.
+        """
+        budget = (budget or Budget(max_iterations=self.max_iterations)).start(self.preferences, self.table_capacity)
+        self.budget = budget
+
+        # Step 1: Start from random tables, the best plan until a round beats it
+        best_plan = self.initialize_random_tables()
+        best_score = best_plan.score()
+        assignment = best_plan.assignment.copy()
+
+        iteration = 0
+        while not budget.should_stop(iteration, best_score):
+            # Step 2: Move every guest to the table they are most compatible with
+            with metrics.timer('k_clustering.assign'):
+                new_assignment = self.assign_guests_to_tables(assignment, budget)
+            if new_assignment is None:
+                continue  # The deadline passed during the round, so should_stop() ends the run
+            iteration += 1
 
             # Step 3: Create and score the current seating plan
-            seating_plan = SeatingPlan(self.guests, self.num_tables, self.table_capacity)
-            seating_plan.tables = tables
+            seating_plan = SeatingPlan.from_assignment(self.guests, new_assignment, self.num_tables,
+                                                       self.table_capacity)
             score = seating_plan.score()
 
             # Step 4: Keep the best scoring plan
@@ -113,17 +193,13 @@ class KClustering:
                 best_plan = seating_plan
                 best_score = score
 
-            # Step 5: Recalculate centroids based on the new table composition
-            new_centroids = self.calculate_new_centroids(tables)
-
-            # Step 6: Stop if centroids no longer change (convergence)
-            if all(new_centroids[i].name == centroids[i].name for i in range(len(centroids))):
+            # Step 5: Stop if the tables no longer change (convergence)
+            if np.array_equal(new_assignment, assignment):
                 break
 
-            centroids = new_centroids
+            assignment = new_assignment
 
-        end_time = time.time()  # Stop measuring time
-        execution_time = end_time - start_time
+        metrics.count('placements', iteration * len(self.guests))
 
-        # Return the best seating plan, its score, and how long it took
-        return best_plan, best_score, execution_time
+        # Return the best seating plan and its score
+        return best_plan, best_score
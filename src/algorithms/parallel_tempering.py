@@ -0,0 +1,166 @@
+import math
+import os
+import random
+import multiprocessing
+import numpy as np
+import metrics
+from seating_plan import SeatingPlan
+from shared_preferences import SharedInstance, attach
+from budget import Budget
+from .simulated_annealing import SimulatedAnnealing
+
+
+def _run_replica(task):
+    """
+    Worker: advances one replica by a number of steps at its temperature.
+
+    Args:
+        task: (guests or SharedInstanceHandle, assignment, num_tables, table_capacity,
+               temperature, steps, seed, deadline) where deadline is an absolute time
+               that ends the sweep early (or None)
+
+    Returns:
+        (assignment, score, best assignment, best score, accepted changes)
+    """
+    guests, assignment, num_tables, table_capacity, temp, steps, seed, deadline = task
+    if not isinstance(guests, list):
+        guests = attach(guests)
+    # Seeded for reproducibility, then restored: with processes=1 the replica runs
+    # in the caller's process and must not reset the caller's random state
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        plan = SeatingPlan.from_assignment(guests, assignment, num_tables, table_capacity)
+        chain = SimulatedAnnealing(plan)
+        accepted = chain.sweep(steps, temp, None if deadline is None else Budget(deadline=deadline))
+    finally:
+        random.setstate(state)
+    return (chain.current_plan.assignment, chain.current_score,
+            chain.best_assignment, chain.best_score, accepted)
+
+
+class ParallelTempering:
+    def __init__(self, seating_plan, num_replicas=4, min_temp=1.0, max_temp=1000.0, temperatures=None,
+                 exchange_interval=500, exchanges=60, processes=None):
+        """
+        Replica exchange (parallel tempering) version of Simulated Annealing.
+
+        One chain runs at each temperature of a geometric ladder, each in a pool
+        worker. Every exchange_interval steps, neighboring temperatures try to swap
+        their configurations with the Metropolis criterion, so good plans found at
+        high temperatures sink to the cold chains instead of relying on reheating.
+
+        Parameters:
+        - seating_plan: Initial SeatingPlan object, the start of every chain.
+        - num_replicas: Number of chains (ignored if temperatures is given).
+        - min_temp, max_temp: Ends of the geometric temperature ladder.
+        - temperatures: Explicit temperature ladder, overriding the three above.
+        - exchange_interval: Steps each chain runs between two exchange rounds.
+        - exchanges: Number of exchange rounds.
+        - processes: Size of the process pool (defaults to the number of chains,
+          capped at the number of CPUs); 1 runs every chain in this process.
+        """
+        if temperatures is None:
+            temperatures = np.geomspace(min_temp, max_temp, num_replicas).tolist()
+        self.temperatures = sorted(float(temp) for temp in temperatures)
+        self.num_replicas = len(self.temperatures)
+        self.exchange_interval = exchange_interval
+        self.exchanges = exchanges
+        self.processes = processes or min(self.num_replicas, os.cpu_count() or 1)
+
+        self.guests = seating_plan.guest_list
+        self.num_tables = seating_plan.num_tables
+        self.table_capacity = seating_plan.table_capacity
+        # Configuration and score of the chain at each temperature, coldest first
+        self.assignments = [seating_plan.assignment.copy() for _ in range(self.num_replicas)]
+        self.scores = [seating_plan.score()] * self.num_replicas
+        self.best_assignment = seating_plan.assignment.copy()
+        self.best_score = seating_plan.score()
+        self.best_plan = None
+
+        self.rounds_done = 0
+        # For analysis: exchange attempts and acceptances between temperatures k and k + 1
+        self.swap_attempts = [0] * (self.num_replicas - 1)
+        self.swap_accepts = [0] * (self.num_replicas - 1)
+        self.move_accepts = [0] * self.num_replicas
+
+    @property
+    def swap_acceptance_rates(self):
+        """Share of accepted exchanges between each pair of neighboring temperatures."""
+        return [accepts / attempts if attempts else 0.0
+                for accepts, attempts in zip(self.swap_accepts, self.swap_attempts)]
+
+    @property
+    def move_acceptance_rates(self):
+        """Share of accepted changes of the chain at each temperature."""
+        steps = self.exchange_interval * self.rounds_done
+        return [accepts / steps if steps else 0.0 for accepts in self.move_accepts]
+
+    def exchange(self, offset):
+        """
+        Tries to swap the configurations of temperatures k and k + 1, for every k of
+        the given parity, so each chain takes part in at most one exchange per round.
+        """
+        for k in range(offset, self.num_replicas - 1, 2):
+            cold, hot = self.temperatures[k], self.temperatures[k + 1]
+            # Probability of the swap under the two Boltzmann distributions (maximizing)
+            log_ratio = (self.scores[k + 1] - self.scores[k]) * (1 / cold - 1 / hot)
+            self.swap_attempts[k] += 1
+            if log_ratio >= 0 or math.exp(log_ratio) > random.random():
+                self.swap_accepts[k] += 1
+                self.assignments[k], self.assignments[k + 1] = self.assignments[k + 1], self.assignments[k]
+                self.scores[k], self.scores[k + 1] = self.scores[k + 1], self.scores[k]
+
+    @metrics.timed('parallel_tempering.run')
+    def run(self, budget=None):
+        """
+        Runs every chain with periodic exchanges and returns the best plan found.
+
+        The budget (see Budget) counts exchange rounds and defaults to self.exchanges.
+        It is checked between rounds; a deadline also cuts the running round short.
+        """
+        budget = (budget or Budget(max_iterations=self.exchanges)).start(self.guests.preferences, self.table_capacity)
+        self.budget = budget
+        self.rounds_done = 0
+        shared = pool = None
+        guests = self.guests
+        if self.processes > 1:
+            shared = SharedInstance(self.guests)
+            pool = multiprocessing.Pool(self.processes)
+            guests = shared.handle
+        try:
+            while not budget.should_stop(self.rounds_done, self.best_score):
+                tasks = [
+                    (guests, assignment, self.num_tables, self.table_capacity, temp, self.exchange_interval,
+                     random.getrandbits(64), budget.deadline)
+                    for assignment, temp in zip(self.assignments, self.temperatures)
+                ]
+                with metrics.timer('parallel_tempering.replicas'):
+                    results = pool.map(_run_replica, tasks) if pool else list(map(_run_replica, tasks))
+                for k, (assignment, score, best_assignment, best_score, accepted) in enumerate(results):
+                    self.assignments[k] = assignment
+                    self.scores[k] = score
+                    self.move_accepts[k] += accepted
+                    if best_score > self.best_score:
+                        self.best_assignment = best_assignment
+                        self.best_score = best_score
+
+                # Alternate between even and odd pairs of neighboring temperatures
+                with metrics.timer('parallel_tempering.exchange'):
+                    self.exchange(self.rounds_done % 2)
+                self.rounds_done += 1
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+                shared.close()
+
+        # Counted here since the chains may run in other processes (deadlines can cut rounds short)
+        steps = self.exchange_interval * self.num_replicas * self.rounds_done
+        metrics.count('delta_evaluations', steps)
+        metrics.count('accepted_moves', sum(self.move_accepts))
+        metrics.count('rejected_moves', steps - sum(self.move_accepts))
+
+        self.best_plan = SeatingPlan.from_assignment(self.guests, self.best_assignment, self.num_tables,
+                                                     self.table_capacity)
+        return self.best_plan, self.best_score
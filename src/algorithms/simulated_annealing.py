@@ -2,15 +2,27 @@ import math
 import random
 import logging
 import time
-from seating_plan import SeatingPlan
+import numpy as np
+import metrics
+from seating_plan import SeatingPlan, MoveJournal
+from budget import Budget
+
+# Plans with at most this many tables pick random tables from a plain list of their
+# counts; larger ones first try TABLE_SAMPLE_TRIES random tables, then scan the counts
+SMALL_PLAN_TABLES = 64
+TABLE_SAMPLE_TRIES = 8
 
 # Configure logging for debug and progress info
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class SimulatedAnnealing:
     def __init__(self, seating_plan, initial_temp=1000, cooling_rate=0.99, iterations=30000):
-        self.current_plan = seating_plan
-        self.best_plan = seating_plan.copy()
+        # Perturbations are applied in place through a journal and undone when rejected,
+        # so work on a copy and only snapshot the best plan as an assignment array
+        self.current_plan = seating_plan.copy()
+        self.journal = MoveJournal(self.current_plan)
+        self.best_assignment = self.current_plan.assignment.copy()
+        self.best_plan = None
         self.current_score = seating_plan.score()
         self.best_score = self.current_score
 
@@ -19,6 +31,7 @@ class SimulatedAnnealing:
         self.temp = initial_temp
         self.cooling_rate = cooling_rate
         self.iterations = iterations
+        self.iterations_done = 0
 
         # Plateau handling
         self.no_improvement_count = 0
@@ -36,71 +49,116 @@ class SimulatedAnnealing:
             'targeted_move': {'attempts': 0, 'improvements': 0}
         }
 
-    def run(self):
-        """Main optimization loop."""
+    @metrics.timed('simulated_annealing.run')
+    def run(self, budget=None):
+        """
+        Main optimization loop.
+
+        The budget (see Budget) defaults to self.iterations iterations. The cooling
+        schedule and strategy mix follow the budget's progress, so a time budget
+        cools down over the available time. Nothing is logged inside the loop; the
+        score and temperature are recorded in self.history every 200 iterations.
+        """
+        budget = (budget or Budget(max_iterations=self.iterations)).start(
+            self.current_plan.preferences, self.current_plan.table_capacity)
+        self.budget = budget
         start_time = time.time()
         logging.info(f"Starting optimization with initial score: {self.current_score}")
-        logging.info(f"Parameters: T={self.initial_temp}, cooling_rate={self.cooling_rate}, iterations={self.iterations}")
+        logging.info(f"Parameters: T={self.initial_temp}, cooling_rate={self.cooling_rate}, iterations={budget.max_iterations}")
 
         self.history.append((0, self.current_score, self.temp))  # Record initial state
 
-        for i in range(self.iterations):
+        i = accepted = 0
+        while not budget.should_stop(i, self.best_score):
+            progress = budget.progress(i)
+
             # If stuck too long, handle plateau
             if self.no_improvement_count > self.max_no_improvement:
                 self._handle_optimization_plateau()
             
             # Choose which neighbor generation strategy to use
-            strategy = self._select_perturbation_strategy(i)
-
-            # Generate a neighbor plan using selected strategy
-            new_plan, strategy_used = self._generate_neighbor(strategy)
-            new_score = new_plan.score()
-            delta = new_score - self.current_score
-
-            # Update stats
-            self.perturbation_stats[strategy_used]['attempts'] += 1
-
-            # Determine if we accept the neighbor
-            accept = False
-            if delta > 0:  # Better solution
-                accept = True
-                self.perturbation_stats[strategy_used]['improvements'] += 1
-                self.no_improvement_count = 0
-            elif math.exp(delta / self.temp) > random.random():  # Worse, but accepted probabilistically
-                accept = True
-                self.no_improvement_count += 1
-            else:  # Rejected
-                self.no_improvement_count += 1
-
-            if accept:
-                self.current_plan = new_plan
-                self.current_score = new_score
-                # Update best solution
-                if self.current_score > self.best_score:
-                    self.best_plan = self.current_plan.copy()
-                    self.best_score = self.current_score
-                    logging.info(f"New best solution found: score = {self.best_score}")
+            strategy = self._select_perturbation_strategy(progress)
+
+            # Perturb the current plan in place and accept or undo the change
+            accepted += self._step(strategy)
 
             # Update temperature
-            self.temp = self._cooling_schedule(i)
+            self.temp = self._cooling_schedule(progress)
 
-            # Periodic logging
-            if i % 200 == 0 or i == self.iterations - 1:
-                elapsed = time.time() - start_time
+            # Periodic snapshot for analysis
+            if i % 200 == 0:
                 self.history.append((i, self.current_score, self.temp))
-                logging.info(
-                    f"Iteration {i}/{self.iterations} ({(i/self.iterations*100):.1f}%) - "
-                    f"Temp: {self.temp:.4f}, Current: {self.current_score:.2f}, "
-                    f"Best: {self.best_score:.2f}, Elapsed: {elapsed:.1f}s"
-                )
+            i += 1
+
+        self.iterations_done = i
+        if i:
+            self.history.append((i - 1, self.current_score, self.temp))
+        # Every step scores exactly one perturbation
+        metrics.count('delta_evaluations', i)
+        metrics.count('accepted_moves', accepted)
+        metrics.count('rejected_moves', i - accepted)
 
         # Final report
         self._log_final_stats(time.time() - start_time)
+        plan = self.current_plan
+        self.best_plan = SeatingPlan.from_assignment(plan.guest_list, self.best_assignment, plan.num_tables, plan.table_capacity)
         return self.best_plan, self.best_score
 
-    def _cooling_schedule(self, iteration):
-        """Custom non-linear cooling schedule."""
-        progress = iteration / self.iterations
+    def _step(self, strategy=None):
+        """
+        One Metropolis step at the current temperature: perturbs the plan in place,
+        then keeps the change or undoes it.
+
+        Returns:
+            bool: True if the change was accepted
+        """
+        strategy_used = self._generate_neighbor(strategy)
+        delta = self.journal.delta
+
+        # Update stats
+        self.perturbation_stats[strategy_used]['attempts'] += 1
+
+        # Determine if we accept the neighbor
+        accept = False
+        if delta > 0:  # Better solution
+            accept = True
+            self.perturbation_stats[strategy_used]['improvements'] += 1
+            self.no_improvement_count = 0
+        elif math.exp(delta / self.temp) > random.random():  # Worse, but accepted probabilistically
+            accept = True
+            self.no_improvement_count += 1
+        else:  # Rejected
+            self.no_improvement_count += 1
+            self.journal.undo()
+
+        if accept:
+            self.journal.commit()
+            self.current_score += delta
+            # Update best solution
+            if self.current_score > self.best_score:
+                self.best_assignment[:] = self.current_plan.assignment
+                self.best_score = self.current_score
+        return accept
+
+    def sweep(self, steps, temp, budget=None):
+        """
+        Runs a number of steps at a fixed temperature, without cooling, plateau
+        handling or logging (used by the replicas of ParallelTempering). A started
+        Budget, if given, can end the sweep early.
+
+        Returns:
+            int: Number of accepted changes
+        """
+        self.temp = temp
+        accepted = 0
+        for step in range(steps):
+            if budget is not None and budget.should_stop(step, self.best_score):
+                break
+            accepted += self._step()
+        return accepted
+
+    def _cooling_schedule(self, progress):
+        """Custom non-linear cooling schedule, given how far the run is (0 to 1)."""
         return self.initial_temp * (self.cooling_rate ** (1 + 2 * progress))
 
     def _handle_optimization_plateau(self):
@@ -108,19 +166,19 @@ class SimulatedAnnealing:
         self.no_improvement_count = 0  # reset
         if random.random() < 0.7:
             self.temp *= self.plateau_cooldown_factor  # cool further
-            logging.info(f"Plateau detected: cooling faster, new temp = {self.temp:.4f}")
+            logging.debug("Plateau detected: cooling faster, new temp = %.4f", self.temp)
         else:
             self.temp *= self.reheat_factor  # reheat to escape local optima
-            logging.info(f"Plateau detected: reheating, new temp = {self.temp:.4f}")
+            logging.debug("Plateau detected: reheating, new temp = %.4f", self.temp)
 
-    def _select_perturbation_strategy(self, iteration):
-        """Dynamically select perturbation strategy depending on the phase of optimization."""
-        if iteration < self.iterations * 0.3:
+    def _select_perturbation_strategy(self, progress):
+        """Dynamically select perturbation strategy depending on the phase of optimization (0 to 1)."""
+        if progress < 0.3:
             return random.choices(
                 ['swap', 'move', 'reassign_cluster', 'table_shuffle', 'targeted_move'],
                 weights=[0.3, 0.3, 0.2, 0.1, 0.1]
             )[0]
-        elif iteration < self.iterations * 0.7:
+        elif progress < 0.7:
             return random.choices(
                 ['swap', 'move', 'reassign_cluster', 'table_shuffle', 'targeted_move'],
                 weights=[0.25, 0.25, 0.2, 0.15, 0.15]
@@ -131,100 +189,117 @@ class SimulatedAnnealing:
                 weights=[0.35, 0.3, 0.15, 0.1, 0.1]
             )[0]
 
-    def _calculate_table_score(self, plan, table_idx):
-        """Helper to compute total preference score at one table."""
-        score = 0
-        table = plan.tables[table_idx]
-        for guest in table.guests:
-            for other in table.guests:
-                if guest != other:
-                    score += guest.get_preference(other)
-        return score
-
     def _find_worst_table(self, plan):
         """Identify the table with the lowest average preference compatibility."""
-        table_scores = []
-        for i, table in enumerate(plan.tables):
-            if len(table.guests) >= 2:
-                score = self._calculate_table_score(plan, i)
-                avg_score = score / (len(table.guests) * (len(table.guests) - 1))
-                table_scores.append((i, avg_score))
-        if table_scores:
-            return min(table_scores, key=lambda x: x[1])[0]
+        worst = plan.worst_table()
+        if worst is not None:
+            return worst
         return random.randint(0, len(plan.tables) - 1)
 
+    def _random_table(self, plan, min_count, max_count, exclude=()):
+        """
+        Index of a random table seating between min_count and max_count guests,
+        other than the tables in exclude, or None if there is none.
+
+        Large plans try a few random tables first, which finds one in constant
+        time while most tables qualify, and only scan the counts if they all fail.
+        Either way every qualifying table is equally likely.
+        """
+        counts = plan.counts
+        num_tables = len(counts)
+        if num_tables <= SMALL_PLAN_TABLES:
+            candidates = [table_idx for table_idx, count in enumerate(counts.tolist())
+                          if min_count <= count <= max_count and table_idx not in exclude]
+            return random.choice(candidates) if candidates else None
+        for _ in range(TABLE_SAMPLE_TRIES):
+            table_idx = random.randrange(num_tables)
+            if table_idx not in exclude and min_count <= counts.item(table_idx) <= max_count:
+                return table_idx
+        candidates = np.flatnonzero((counts >= min_count) & (counts <= max_count))
+        candidates = candidates[~np.isin(candidates, exclude)].tolist()
+        return random.choice(candidates) if candidates else None
+
     def _generate_neighbor(self, strategy=None):
-        """Apply one of several perturbation strategies to generate a new seating arrangement."""
+        """
+        Apply one of several perturbation strategies to the current plan, in place.
+
+        Every change goes through self.journal, which keeps the score delta and
+        can undo the perturbation if it is rejected. Tables and guests are picked
+        by reading single entries of plan.counts and plan.slots.
+
+        Returns:
+            str: The strategy that was used
+        """
         if strategy is None:
             strategy = random.choice(['swap', 'move', 'reassign_cluster', 'table_shuffle', 'targeted_move'])
 
-        new_plan = self.current_plan.copy()
-        non_empty_tables = [i for i, t in enumerate(new_plan.tables) if t.guests]
+        plan = self.current_plan
+        journal = self.journal
+        capacity = plan.table_capacity
+        counts = plan.counts
+        slots = plan.slots
+        guests_by_id = plan.preferences.guests
 
-        if not non_empty_tables:
-            return new_plan, 'move'  # Nothing to change
+        src = self._random_table(plan, 1, capacity)
+        if src is None:
+            return 'move'  # Nothing to change
 
         # Each block below applies a different strategy
-        if strategy == 'swap' and len(non_empty_tables) >= 2:
-            t1, t2 = random.sample(non_empty_tables, 2)
-            if new_plan.tables[t1].guests and new_plan.tables[t2].guests:
-                g1 = random.choice(new_plan.tables[t1].guests)
-                g2 = random.choice(new_plan.tables[t2].guests)
-                new_plan.tables[t1].remove_guest(g1)
-                new_plan.tables[t2].remove_guest(g2)
-                new_plan.tables[t1].add_guest(g2)
-                new_plan.tables[t2].add_guest(g1)
+        if strategy == 'swap':
+            other = self._random_table(plan, 1, capacity, exclude=(src,))
+            if other is not None:
+                g1 = guests_by_id[slots.item(src, random.randrange(counts.item(src)))]
+                g2 = guests_by_id[slots.item(other, random.randrange(counts.item(other)))]
+                journal.swap(g1, g2)
 
         elif strategy == 'move':
-            src = random.choice(non_empty_tables)
-            guest = random.choice(new_plan.tables[src].guests)
-            possible_targets = [i for i in range(len(new_plan.tables)) if i != src and not new_plan.tables[i].is_full()]
-            if possible_targets:
-                tgt = random.choice(possible_targets)
-                new_plan.move_guest(guest, src, tgt)
+            guest = guests_by_id[slots.item(src, random.randrange(counts.item(src)))]
+            tgt = self._random_table(plan, 0, capacity - 1, exclude=(src,))
+            if tgt is not None:
+                journal.move(guest, tgt)
 
         elif strategy == 'reassign_cluster':
             cluster_size = random.randint(2, 5)
-            src = random.choice(non_empty_tables)
-            guests = random.sample(new_plan.tables[src].guests, min(cluster_size, len(new_plan.tables[src].guests)))
-            targets = [i for i in range(len(new_plan.tables)) if i != src and len(new_plan.tables[i].guests) + len(guests) <= new_plan.tables[i].capacity]
-            if targets:
-                tgt = random.choice(targets)
+            count = counts.item(src)
+            seats = random.sample(range(count), min(cluster_size, count))
+            guests = [guests_by_id[slots.item(src, seat)] for seat in seats]
+            tgt = self._random_table(plan, 0, capacity - len(guests), exclude=(src,))
+            if tgt is not None:
                 for guest in guests:
-                    new_plan.move_guest(guest, src, tgt)
+                    journal.move(guest, tgt)
 
         elif strategy == 'table_shuffle':
-            if len(non_empty_tables) >= 2:
-                tables = random.sample(non_empty_tables, min(3, len(non_empty_tables)))
+            tables = [src]
+            for _ in range(2):
+                other = self._random_table(plan, 1, capacity, exclude=tables)
+                if other is None:
+                    break
+                tables.append(other)
+            if len(tables) >= 2:
                 all_guests = []
                 for t in tables:
-                    all_guests.extend(new_plan.tables[t].guests.copy())
-                    for g in new_plan.tables[t].guests.copy():
-                        new_plan.tables[t].remove_guest(g)
+                    all_guests.extend(guests_by_id[guest_id] for guest_id in slots[t, :counts.item(t)].tolist())
+                for guest in all_guests:
+                    journal.remove(guest)
                 random.shuffle(all_guests)
                 for guest in all_guests:
                     for t in tables:
-                        if not new_plan.tables[t].is_full():
-                            new_plan.tables[t].add_guest(guest)
+                        if journal.add(guest, t):
                             break
 
         elif strategy == 'targeted_move':
-            worst_idx = self._find_worst_table(new_plan)
-            table = new_plan.tables[worst_idx]
-            if len(table.guests) >= 2:
-                worst_guest = min(table.guests, key=lambda g: sum(g.get_preference(o) for o in table.guests if o != g))
-                best_target = None
-                best_score = -float('inf')
-                for i, t in enumerate(new_plan.tables):
-                    if i != worst_idx and not t.is_full():
-                        score = sum(worst_guest.get_preference(g) + g.get_preference(worst_guest) for g in t.guests)
-                        if score > best_score:
-                            best_score = score
-                            best_target = i
-                if best_target is not None:
-                    new_plan.move_guest(worst_guest, worst_idx, best_target)
-
-        return new_plan, strategy
+            worst_idx = self._find_worst_table(plan)
+            if counts.item(worst_idx) >= 2:
+                # The guest with the lowest cached affinity goes to the open table they like most
+                worst_guest = plan.worst_guest(worst_idx)
+                scores = plan.table_affinities(worst_guest).astype(float)
+                scores[counts >= capacity] = -np.inf
+                scores[worst_idx] = -np.inf
+                best_target = int(np.argmax(scores))
+                if scores[best_target] > -np.inf:
+                    journal.move(worst_guest, best_target)
+
+        return strategy
 
     def _log_final_stats(self, elapsed_time):
         """Print and log summary statistics after optimization ends."""
@@ -232,7 +307,7 @@ class SimulatedAnnealing:
         logging.info("Simulated Annealing Complete")
         logging.info(f"Final best score: {self.best_score}")
         logging.info(f"Total runtime: {elapsed_time:.2f} seconds")
-        logging.info(f"Iterations: {self.iterations}")
+        logging.info(f"Iterations: {self.iterations_done}")
 
         logging.info("Strategy effectiveness:")
         for strategy, stats in self.perturbation_stats.items():
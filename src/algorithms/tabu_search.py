@@ -1,83 +1,247 @@
 import random
-from seating_plan import SeatingPlan, Table
+from collections import deque
+import numpy as np
+import metrics
+from affinity import GuestTableAffinity
+from budget import Budget
+
+
+class TabuMemory:
+    """
+    Tabu attributes (guest, table) with the iteration they expire at.
+
+    When a guest leaves a table, going back to it is tabu for `tenure` iterations.
+    Attributes live in a dict keyed by guest_id * num_tables + table_idx, so a
+    check is O(1) whatever the tenure, and whole candidate batches are checked
+    against the few live keys with one np.isin.
+    """
+
+    def __init__(self, tenure, num_tables):
+        self.tenure = tenure
+        self.num_tables = num_tables
+        self.iteration = 0
+        self._expiry = {}         # Key -> first iteration the attribute is no longer tabu
+        self._order = deque()     # (expiry, key) in insertion order, to drop expired keys
+
+    def add(self, guest_id, table_idx):
+        """Makes seating the guest at the table tabu for the next `tenure` iterations."""
+        key = int(guest_id) * self.num_tables + int(table_idx)
+        expiry = self.iteration + self.tenure + 1
+        self._expiry[key] = expiry
+        self._order.append((expiry, key))
+
+    def advance(self):
+        """Moves to the next iteration, forgetting the attributes that expired."""
+        self.iteration += 1
+        while self._order and self._order[0][0] <= self.iteration:
+            expiry, key = self._order.popleft()
+            # The key may have been made tabu again later, with a later expiry
+            if self._expiry.get(key) == expiry:
+                del self._expiry[key]
+
+    def is_tabu(self, guest_id, table_idx):
+        return int(guest_id) * self.num_tables + int(table_idx) in self._expiry
+
+    def tabu_mask(self, guest_ids, table_ids):
+        """Element-wise is_tabu over arrays of guest ids and table indices."""
+        if not self._expiry:
+            return np.zeros(len(guest_ids), dtype=bool)
+        keys = np.asarray(guest_ids, dtype=np.int64) * self.num_tables + table_ids
+        return np.isin(keys, np.fromiter(self._expiry, dtype=np.int64, count=len(self._expiry)))
+
+    def __len__(self):
+        return len(self._expiry)
+
 
 class TabuSearch:
-    def __init__(self, seating_plan, tabu_tenure=5, max_iterations=1000):
+    def __init__(self, seating_plan, tabu_tenure=5, max_iterations=1000, neighborhood='sampled', batch_size=4096,
+                 aspiration=True):
         """
         Initialize the Tabu Search algorithm.
-        
+
         Parameters:
         - seating_plan: Initial SeatingPlan object.
-        - tabu_tenure: Number of iterations a solution remains in the tabu list.
+        - tabu_tenure: Number of iterations a guest may not go back to a table they left.
         - max_iterations: Maximum number of iterations to run the search.
+        - neighborhood: 'sampled' looks at 10 random swaps per iteration; 'batch'
+          scores every swap and move (or batch_size random ones of each when there
+          are more) in one vectorized pass per iteration, at the cost of keeping a
+          guests x tables affinity matrix (8 bytes per guest and table).
+        - batch_size: Largest number of swaps, and of moves, scored per iteration in
+          'batch' mode.
+        - aspiration: Allow tabu moves that lead to a new best score.
         """
-        self.current_plan = seating_plan  # Current solution
-        self.best_plan = seating_plan     # Best solution found so far
+        if neighborhood not in ('batch', 'sampled'):
+            raise ValueError(f"Unknown neighborhood '{neighborhood}', expected 'batch' or 'sampled'.")
+        self.current_plan = seating_plan.copy()    # Current solution, modified in place
+        self.best_plan = seating_plan.copy()       # Best solution found so far
         self.current_score = seating_plan.score()  # Score of current plan
         self.best_score = self.current_score       # Score of best plan
 
-        self.tabu_list = []              # List to keep recently visited solutions (tabu)
-        self.tabu_tenure = tabu_tenure   # Maximum size of the tabu list
+        self.tabu_tenure = tabu_tenure   # Iterations a (guest, table) attribute stays tabu
+        self.tabu = TabuMemory(tabu_tenure, seating_plan.num_tables)
+        self.aspiration = aspiration
         self.max_iterations = max_iterations  # Stop after this many iterations
+        self.evaluated = 0                    # Candidates scored during the last run
 
-    def run(self):
-        """Main optimization loop for Tabu Search."""
-        for _ in range(self.max_iterations):
-            # Generate neighboring solutions
-            neighborhood = self._generate_neighbors()
+        self.neighborhood = neighborhood
+        self.batch_size = batch_size
+        if neighborhood == 'batch':
+            self.affinity = GuestTableAffinity(self.current_plan)
+            # Seeded from the random module so random.seed() still makes runs repeatable
+            self.rng = np.random.default_rng(random.getrandbits(64))
+            self._all_swaps = self._all_moves = None
+            num_guests = len(self.current_plan.preferences)
+            num_tables = self.current_plan.num_tables
+            if num_guests * (num_guests - 1) // 2 <= batch_size:
+                self._all_swaps = np.triu_indices(num_guests, 1)
+            if num_guests * num_tables <= batch_size:
+                guest_ids, table_ids = np.indices((num_guests, num_tables))
+                self._all_moves = (guest_ids.ravel(), table_ids.ravel())
 
-            best_neighbor = None
-            best_neighbor_score = float('-inf')
+    @metrics.timed('tabu_search.run')
+    def run(self, budget=None):
+        """
+        Main optimization loop for Tabu Search.
 
-            # Evaluate all neighbors and select the best non-tabu one
-            for neighbor in neighborhood:
-                if neighbor not in self.tabu_list:
-                    neighbor_score = neighbor.score()
-                    if neighbor_score > best_neighbor_score:
-                        best_neighbor = neighbor
-                        best_neighbor_score = neighbor_score
+        Parameters:
+        - budget: Budget deciding when to stop, max_iterations iterations by default.
+        """
+        budget = (budget or Budget(max_iterations=self.max_iterations)).start(
+            self.current_plan.preferences, self.current_plan.table_capacity)
+        self.budget = budget
+        self.evaluated = 0
+        iteration = moves_made = 0
+        while not budget.should_stop(iteration, self.best_score):
+            iteration += 1
+            if self.neighborhood == 'batch':
+                best_move, best_delta = self._best_batch_move()
+            else:
+                best_move, best_delta = self._best_sampled_move()
 
-            # Move to the best non-tabu neighbor
-            if best_neighbor:
-                self.current_plan = best_neighbor
-                self.current_score = best_neighbor_score
+            # Move to the best admissible neighbor
+            if best_move:
+                moves_made += 1
+                kind, guest, other = best_move
+                if kind == 'move':
+                    # Going back to the table the guest leaves is tabu for a while
+                    self.tabu.add(guest.id, self.current_plan.table_of(guest))
+                    self.affinity.move(guest, other)
+                else:
+                    self.tabu.add(guest.id, self.current_plan.table_of(guest))
+                    self.tabu.add(other.id, self.current_plan.table_of(other))
+                    if self.neighborhood == 'batch':
+                        self.affinity.swap(guest, other)
+                    else:
+                        self.current_plan.swap(guest, other)
+                self.current_score += best_delta
 
                 # Update the best plan if this neighbor is better
                 if self.current_score > self.best_score:
-                    self.best_plan = self.current_plan
+                    self.best_plan = self.current_plan.copy()
                     self.best_score = self.current_score
 
-                # Add the current plan to the tabu list
-                self.tabu_list.append(self.current_plan)
-
-                # Maintain tabu tenure (FIFO queue)
-                if len(self.tabu_list) > self.tabu_tenure:
-                    self.tabu_list.pop(0)
+            self.tabu.advance()
 
+        # One candidate is taken per iteration, every other one scored is passed over
+        metrics.count('delta_evaluations', self.evaluated)
+        metrics.count('accepted_moves', moves_made)
+        metrics.count('rejected_moves', self.evaluated - moves_made)
         return self.best_plan, self.best_score
 
+    def _best_sampled_move(self):
+        """Best admissible swap among 10 random ones, as (('swap', guest1, guest2), delta)."""
+        # Generate neighboring moves together with their score changes
+        neighborhood = self._generate_neighbors()
+        self.evaluated += len(neighborhood)
+
+        best_move = None
+        best_delta = float('-inf')
+
+        # Evaluate all neighbors and select the best admissible one
+        plan = self.current_plan
+        for guest1, guest2, delta in neighborhood:
+            tabu = (self.tabu.is_tabu(guest1.id, plan.table_of(guest2))
+                    or self.tabu.is_tabu(guest2.id, plan.table_of(guest1)))
+            if tabu and not self._aspires(delta):
+                continue
+            if delta > best_delta:
+                best_move = ('swap', guest1, guest2)
+                best_delta = delta
+        return best_move, best_delta
+
+    def _aspires(self, delta):
+        """Aspiration criterion: a tabu move is allowed if it beats the best score."""
+        return self.aspiration and self.current_score + delta > self.best_score
+
+    def _best_batch_move(self):
+        """
+        Best admissible swap or move of the batch neighborhood.
+
+        Returns:
+        - (('swap', guest1, guest2), delta), (('move', guest, table index), delta),
+          or (None, -inf) if no candidate is possible.
+        """
+        num_guests = len(self.current_plan.preferences)
+        num_tables = self.current_plan.num_tables
+        if self._all_swaps is not None:
+            swap_ids1, swap_ids2 = self._all_swaps
+        else:
+            swap_ids1 = self.rng.integers(num_guests, size=self.batch_size)
+            swap_ids2 = self.rng.integers(num_guests, size=self.batch_size)
+        if self._all_moves is not None:
+            move_ids, move_tables = self._all_moves
+        else:
+            move_ids = self.rng.integers(num_guests, size=self.batch_size)
+            move_tables = self.rng.integers(num_tables, size=self.batch_size)
+
+        # All candidate deltas in one array: swaps first, then moves
+        assignment = self.current_plan.assignment
+        deltas = np.concatenate([
+            self.affinity.swap_deltas(swap_ids1, swap_ids2),
+            self.affinity.move_deltas(move_ids, move_tables),
+        ])
+        self.evaluated += len(deltas)
+        # A swap is tabu if either guest would go back to a table they recently left
+        tabu = np.concatenate([
+            self.tabu.tabu_mask(swap_ids1, assignment[swap_ids2])
+            | self.tabu.tabu_mask(swap_ids2, assignment[swap_ids1]),
+            self.tabu.tabu_mask(move_ids, move_tables),
+        ])
+        if self.aspiration:
+            tabu &= self.current_score + deltas <= self.best_score
+        deltas[tabu] = -np.inf
+
+        idx = int(np.argmax(deltas))
+        delta = deltas[idx]
+        if delta == -np.inf:
+            return None, float('-inf')
+        guests = self.current_plan.preferences.guests
+        num_swaps = len(swap_ids1)
+        if idx < num_swaps:
+            return ('swap', guests[swap_ids1[idx]], guests[swap_ids2[idx]]), int(delta)
+        idx -= num_swaps
+        return ('move', guests[move_ids[idx]], int(move_tables[idx])), int(delta)
+
     def _generate_neighbors(self):
         """
-        Generates neighboring solutions by swapping guests between tables.
+        Generates neighboring solutions as guest swaps between tables.
 
         Returns:
-        - A list of new SeatingPlan objects with slightly modified seating.
+        - A list of (guest1, guest2, delta) tuples, where delta is the score change the
+          swap would cause. The plan itself is not modified.
         """
         neighbors = []
+        plan = self.current_plan
         for _ in range(10):  # Create 10 different neighbors
-            # Deep copy the current seating plan
-            new_plan = SeatingPlan(self.current_plan.guest_list, len(self.current_plan.tables), self.current_plan.tables[0].capacity)
-            new_plan.tables = [Table(table.capacity) for table in self.current_plan.tables]
-            
-            # Copy guests to the new plan
-            for i, table in enumerate(self.current_plan.tables):
-                new_plan.tables[i].guests = table.guests[:]  # Shallow copy guest list per table
-
-            # Randomly select two tables and perform a guest swap
-            table1, table2 = random.sample(range(len(new_plan.tables)), 2)
-            new_plan.swap_guests(table1, table2)
-
-            # Add modified plan to neighborhood
-            neighbors.append(new_plan)
+            # Randomly select two tables and a guest from each
+            table1, table2 = random.sample(range(len(plan.tables)), 2)
+            if not plan.tables[table1].guests or not plan.tables[table2].guests:
+                continue
+            guest1 = random.choice(plan.tables[table1].guests)
+            guest2 = random.choice(plan.tables[table2].guests)
+
+            # Add the move and its score change to the neighborhood
+            neighbors.append((guest1, guest2, plan.delta_swap(guest1, guest2)))
 
         return neighbors
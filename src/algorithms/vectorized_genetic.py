@@ -0,0 +1,228 @@
+import random
+import numpy as np
+import metrics
+from seating_plan import SeatingPlan
+from preferences import preferences_for
+from budget import Budget
+
+# Scoring compares every individual on every preference; individuals are scored in
+# chunks so the comparison never holds more than this many elements at once
+SCORE_CHUNK_ELEMENTS = 1 << 24
+# Individuals are created (seeded or bred) and scored in smaller chunks, so a budget's
+# deadline is checked every few tens of milliseconds however large the instance
+BUDGET_CHUNK_ELEMENTS = 1 << 22
+
+
+class VectorizedGeneticAlgorithm:
+    def __init__(self, guests, num_tables, table_capacity, population_size=1000, generations=200, mutation_rate=0.1,
+                 elitism_rate=0.1, tournament_size=3):
+        """
+        Genetic Algorithm working on the whole population at once.
+
+        The population is a (population_size, num_guests) array where row p holds the
+        table of every guest in individual p, so each guest is always seated exactly
+        once. Scoring, tournament selection, crossover, capacity repair and mutation
+        are batched array operations over all individuals.
+
+        Parameters:
+        - guests: List of all guests.
+        - num_tables: Total number of tables.
+        - table_capacity: Maximum number of guests per table.
+        - population_size: Number of solutions in each generation.
+        - generations: Number of generations to evolve.
+        - mutation_rate: Probability that a child gets two of its guests swapped.
+        - elitism_rate: Proportion of best solutions carried forward unchanged.
+        - tournament_size: Individuals competing in each tournament selection.
+        """
+        self.guests = guests
+        self.preferences = preferences_for(guests)
+        self.num_guests = len(self.preferences)
+        self.num_tables = num_tables
+        self.table_capacity = table_capacity
+        self.population_size = population_size
+        self.generations = generations
+        self.mutation_rate = mutation_rate
+        self.elitism_rate = elitism_rate
+        self.tournament_size = tournament_size
+        if self.num_guests > num_tables * table_capacity:
+            raise ValueError("Not enough seats for all guests. Consider increasing table capacity or number of tables.")
+        # Seeded from the random module so random.seed() still makes runs repeatable
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        self.rows, self.cols, values = self.preferences.triplets()
+        self.values = np.asarray(values, dtype=np.int64)
+
+    def initialize_population(self, count=None):
+        """
+        `count` random individuals (population_size by default), filling the tables one
+        after the other like SeatingPlan does.
+        """
+        size = (self.population_size if count is None else count, self.num_guests)
+        order = np.argsort(self.rng.random(size), axis=1)
+        population = np.empty(size, dtype=np.int32)
+        tables = np.broadcast_to(np.arange(self.num_guests, dtype=np.int32) // self.table_capacity, size)
+        np.put_along_axis(population, order, tables, axis=1)
+        return population
+
+    def fitness(self, population):
+        """Scores of all individuals: the preferences between guests sharing a table."""
+        scores = np.empty(len(population), dtype=np.int64)
+        chunk = max(1, SCORE_CHUNK_ELEMENTS // max(len(self.values), 1))
+        for start in range(0, len(population), chunk):
+            block = population[start:start + chunk]
+            together = block[:, self.rows] == block[:, self.cols]
+            scores[start:start + chunk] = together @ self.values
+        return scores
+
+    def seed_population(self, budget=None):
+        """
+        Random initial population and its fitness scores, built and scored a chunk of
+        individuals at a time. A started Budget is checked between chunks, so on large
+        instances a short budget ends up with a smaller population (at least one
+        chunk) instead of overrunning its deadline before the first generation.
+
+        Returns:
+        - (population, fitness_scores)
+        """
+        chunk = self._budget_chunk()
+        blocks, scores = [], []
+        for start in range(0, self.population_size, chunk):
+            if blocks and budget is not None and budget.should_stop(0, max(int(block_scores.max()) for block_scores in scores)):
+                break
+            blocks.append(self.initialize_population(min(chunk, self.population_size - start)))
+            scores.append(self.fitness(blocks[-1]))
+        metrics.count('fitness_evaluations', sum(len(block) for block in blocks))
+        return np.concatenate(blocks), np.concatenate(scores)
+
+    def _budget_chunk(self):
+        """Individuals created and scored between two checks of the budget."""
+        return max(1, BUDGET_CHUNK_ELEMENTS // max(len(self.values), self.num_guests, 1))
+
+    def selection(self, fitness_scores, count):
+        """Indices of `count` parents, each the best of tournament_size random individuals."""
+        contenders = self.rng.integers(len(fitness_scores), size=(count, self.tournament_size))
+        winners = np.argmax(fitness_scores[contenders], axis=1)
+        return contenders[np.arange(count), winners]
+
+    def crossover(self, parents1, parents2):
+        """
+        Uniform crossover: every guest takes the table they have in either parent.
+
+        Children may then have more guests at a table than it seats; repair() fixes that.
+        """
+        from_second = self.rng.random(parents1.shape) < 0.5
+        return self.repair(np.where(from_second, parents2, parents1))
+
+    def repair(self, children):
+        """
+        Moves guests out of over-full tables into free seats, in place.
+
+        Guests to evict are chosen at random among a table's guests, and go to random
+        free seats of the same child, so every guest stays seated exactly once.
+        """
+        num_children, num_guests = children.shape
+        num_tables, capacity = self.num_tables, self.table_capacity
+
+        # Rank guests within their (child, table) group in random order; adding a
+        # random fraction to the group number sorts by group, then randomly
+        cells = np.arange(num_children)[:, None] * num_tables + children
+        cells = cells.ravel()
+        order = np.argsort(cells + self.rng.random(cells.size))
+        sorted_cells = cells[order]
+        counts = np.bincount(cells, minlength=num_children * num_tables)
+        group_start = np.cumsum(counts) - counts
+        rank = np.empty(cells.size, dtype=np.int64)
+        rank[order] = np.arange(cells.size) - group_start[sorted_cells]
+        overflow = np.flatnonzero(rank >= capacity)
+        if not len(overflow):
+            return children
+
+        # Free seats of every child, one entry per seat, tables in random order
+        free = np.maximum(capacity - counts, 0)
+        free_cells = np.repeat(np.arange(num_children * num_tables), free)
+        shuffle = np.argsort(free_cells // num_tables + self.rng.random(free_cells.size))
+        free_cells = free_cells[shuffle]
+
+        # The k-th evicted guest of a child takes the k-th free seat of that child
+        overflow_child = overflow // num_guests
+        per_child = np.bincount(overflow_child, minlength=num_children)
+        overflow_rank = np.arange(len(overflow)) - (np.cumsum(per_child) - per_child)[overflow_child]
+        free_per_child = np.bincount(free_cells // num_tables, minlength=num_children)
+        free_start = np.cumsum(free_per_child) - free_per_child
+        seats = free_cells[free_start[overflow_child] + overflow_rank]
+        children.reshape(-1)[overflow] = seats % num_tables
+        return children
+
+    def mutation(self, children):
+        """Swaps the tables of two random guests in a mutation_rate share of the children, in place."""
+        mutated = np.flatnonzero(self.rng.random(len(children)) < self.mutation_rate)
+        guests1 = self.rng.integers(self.num_guests, size=len(mutated))
+        guests2 = self.rng.integers(self.num_guests, size=len(mutated))
+        tables1 = children[mutated, guests1]
+        children[mutated, guests1] = children[mutated, guests2]
+        children[mutated, guests2] = tables1
+
+    def evolve(self, population, generations=None, budget=None, fitness_scores=None):
+        """
+        Evolves a population for a number of generations, or until a started Budget
+        says to stop (at least one of the two must be given). The population is scored
+        first unless its fitness_scores are given.
+
+        Elites are carried forward unchanged, so the best individual of the returned
+        population is the best one seen along the way. Children are bred and scored a
+        chunk at a time; once the budget's deadline has passed, the generation ends
+        with the children made so far.
+
+        Returns:
+        - (population, fitness_scores) after the last generation.
+        """
+        num_elites = min(max(1, int(self.elitism_rate * len(population))), len(population))
+        num_children = len(population) - num_elites
+        evaluated = 0
+        if fitness_scores is None:
+            fitness_scores = self.fitness(population)
+            evaluated += len(population)
+        chunk = self._budget_chunk()
+
+        gen = 0
+        while generations is None or gen < generations:
+            if budget is not None and budget.should_stop(gen, int(fitness_scores.max())):
+                break
+            gen += 1
+            # Elites are carried forward, the rest of the next generation are children
+            elite_idx = np.argsort(fitness_scores)[::-1][:num_elites]
+            blocks, scores = [population[elite_idx]], [fitness_scores[elite_idx]]
+            for start in range(0, num_children, chunk):
+                if start and budget is not None and budget.remaining() == 0:
+                    break
+                count = min(chunk, num_children - start)
+                with metrics.timer('vectorized_genetic.selection'):
+                    parents1 = population[self.selection(fitness_scores, count)]
+                    parents2 = population[self.selection(fitness_scores, count)]
+                with metrics.timer('vectorized_genetic.crossover'):
+                    children = self.crossover(parents1, parents2)
+                with metrics.timer('vectorized_genetic.mutation'):
+                    self.mutation(children)
+                with metrics.timer('vectorized_genetic.fitness'):
+                    scores.append(self.fitness(children))
+                blocks.append(children)
+                evaluated += count
+            population, fitness_scores = np.concatenate(blocks), np.concatenate(scores)
+
+        metrics.count('fitness_evaluations', evaluated)
+        return population, fitness_scores
+
+    @metrics.timed('vectorized_genetic.run')
+    def run(self, budget=None):
+        """
+        Main loop for running the Genetic Algorithm and returning the best solution.
+
+        Parameters:
+        - budget: Budget deciding when to stop, counted in generations (self.generations by default).
+        """
+        budget = (budget or Budget(max_iterations=self.generations)).start(self.preferences, self.table_capacity)
+        self.budget = budget
+        population, fitness_scores = self.seed_population(budget)
+        population, fitness_scores = self.evolve(population, budget=budget, fitness_scores=fitness_scores)
+        best_idx = int(np.argmax(fitness_scores))
+        best_plan = SeatingPlan.from_assignment(self.guests, population[best_idx], self.num_tables, self.table_capacity)
+        return best_plan, int(fitness_scores[best_idx])
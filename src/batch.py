@@ -0,0 +1,220 @@
+"""
+Headless batch runner: every combination of datasets, table counts, algorithms
+and seeds, run in a process pool, with one JSON line per finished run.
+
+Nothing here imports tkinter or matplotlib, so it runs on machines without a display.
+
+Example:
+    python src/batch.py datasets/large.csv datasets/extra_large.csv --capacity 10 \\
+        --algorithms tabu_search simulated_annealing --seeds 1 2 3 --time-budget 5 > results.jsonl
+"""
+import argparse
+import inspect
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from contextlib import nullcontext
+import metrics
+from seating_plan import SeatingPlan
+from utils import read_input_csv
+from budget import Budget
+from bounds import upper_bound, optimality_gap
+from algorithms import (SimulatedAnnealing, HillClimbing, Greedy, TabuSearch, GeneticAlgorithm, KClustering,
+                        VectorizedGeneticAlgorithm, IslandGeneticAlgorithm, ParallelTempering)
+
+
+def _plan_search(optimizer_class, **settings):
+    """Runner of an optimizer that starts from a random SeatingPlan."""
+    def run(guests, num_tables, table_capacity, budget):
+        optimizer = optimizer_class(SeatingPlan(guests, num_tables, table_capacity), **settings)
+        best_plan, best_score = optimizer.run(budget)
+        return best_plan, best_score, optimizer.budget
+    return run
+
+
+def _guest_search(optimizer_class, **settings):
+    """Runner of an optimizer built from the guest list."""
+    def run(guests, num_tables, table_capacity, budget):
+        optimizer = optimizer_class(guests, num_tables, table_capacity, **settings)
+        best_plan, best_score = optimizer.run(budget)
+        return best_plan, best_score, optimizer.budget
+    return run
+
+
+# Every algorithm the runner knows, by name. Each entry takes (guests, num_tables,
+# table_capacity, budget) and returns (best_plan, best_score, running budget).
+# Jobs already run in pool workers, so the algorithms that have a pool of their own
+# run it in-process here.
+SOLVERS = {
+    'greedy': _guest_search(Greedy),
+    'k_clustering': _guest_search(KClustering),
+    'hill_climbing': _plan_search(HillClimbing),
+    'simulated_annealing': _plan_search(SimulatedAnnealing),
+    'tabu_search': _plan_search(TabuSearch),
+    'parallel_tempering': _plan_search(ParallelTempering, processes=1),
+    'genetic': _guest_search(GeneticAlgorithm),
+    'vectorized_genetic': _guest_search(VectorizedGeneticAlgorithm),
+    'island_genetic': _guest_search(IslandGeneticAlgorithm, processes=1),
+}
+
+def _default(optimizer_class, parameter):
+    return inspect.signature(optimizer_class.__init__).parameters[parameter].default
+
+
+# Iterations each algorithm stops at without a budget (its run()'s default Budget),
+# for callers that add other rules (e.g. a time limit) without dropping that cap
+DEFAULT_ITERATIONS = {
+    'greedy': 1,
+    'k_clustering': _default(KClustering, 'max_iterations'),
+    'hill_climbing': _default(HillClimbing, 'max_iterations'),
+    'simulated_annealing': _default(SimulatedAnnealing, 'iterations'),
+    'tabu_search': _default(TabuSearch, 'max_iterations'),
+    'parallel_tempering': _default(ParallelTempering, 'exchanges'),
+    'genetic': _default(GeneticAlgorithm, 'generations'),
+    'vectorized_genetic': _default(VectorizedGeneticAlgorithm, 'generations'),
+    'island_genetic': _default(IslandGeneticAlgorithm, 'generations'),
+}
+
+# Instances already read in this worker process, by dataset path
+_instances = {}
+
+
+def _load(dataset):
+    guests = _instances.get(dataset)
+    if guests is None:
+        guests = _instances[dataset] = read_input_csv(dataset)
+    return guests
+
+
+def run_job(job):
+    """
+    Runs one (dataset, tables, algorithm, seed) job.
+
+    Args:
+        job: dict with dataset, num_tables (None for as few tables as fit everyone),
+             table_capacity, algorithm, seed, the Budget settings (time_limit,
+             max_iterations, gap_tolerance; all None for the algorithm's default),
+             assignment (whether to include the best plan's guest -> table array) and
+             metrics (whether to include the run's counters and timers, see metrics.Metrics)
+
+    Returns:
+        dict: The job plus score, upper_bound, gap, stop_reason, time and num_guests,
+              or the job plus error if it failed
+    """
+    record = {key: job[key] for key in ('dataset', 'num_tables', 'table_capacity', 'algorithm', 'seed')}
+    start_time = time.time()
+    try:
+        guests = _load(job['dataset'])
+        num_tables = job['num_tables'] or math.ceil(len(guests) / job['table_capacity'])
+        budget = None
+        if any(job[key] is not None for key in ('time_limit', 'max_iterations')):
+            budget = Budget(time_limit=job['time_limit'], max_iterations=job['max_iterations'],
+                            gap_tolerance=job['gap_tolerance'])
+
+        random.seed(job['seed'])
+        with metrics.collecting() if job['metrics'] else nullcontext() as collected:
+            best_plan, best_score, running = SOLVERS[job['algorithm']](guests, num_tables, job['table_capacity'],
+                                                                       budget)
+        bound = running.upper_bound if running.upper_bound is not None \
+            else upper_bound(guests.preferences, job['table_capacity'])
+        record.update(
+            num_tables=num_tables,
+            num_guests=len(guests),
+            score=int(best_score),
+            upper_bound=bound,
+            gap=optimality_gap(best_score, bound),
+            stop_reason=running.stop_reason,
+        )
+        if job['assignment']:
+            record['assignment'] = best_plan.assignment.tolist()
+        if collected is not None:
+            record['metrics'] = collected.to_dict()
+    except Exception as error:
+        record['error'] = f"{type(error).__name__}: {error}"
+    record['time'] = time.time() - start_time
+    return record
+
+
+def build_jobs(args):
+    """Every combination of the command-line datasets, table counts, algorithms and seeds."""
+    return [
+        {
+            'dataset': dataset,
+            'num_tables': num_tables,
+            'table_capacity': args.capacity,
+            'algorithm': algorithm,
+            'seed': seed,
+            'time_limit': args.time_budget,
+            'max_iterations': args.max_iterations,
+            'gap_tolerance': args.gap_tolerance,
+            'assignment': args.assignments,
+            'metrics': args.metrics,
+        }
+        for dataset, num_tables, algorithm, seed in itertools.product(
+            args.datasets, args.tables or [None], args.algorithms, args.seeds)
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run seating plan optimizers headlessly and stream JSON-lines results.")
+    parser.add_argument('datasets', nargs='+', help="Preference CSV files.")
+    parser.add_argument('--tables', type=int, nargs='+',
+                        help="Table counts to try (default: as few tables as seat every guest).")
+    parser.add_argument('--capacity', type=int, default=10, help="Seats per table (default: 10).")
+    parser.add_argument('--algorithms', nargs='+', default=list(SOLVERS), choices=list(SOLVERS), metavar='NAME',
+                        help=f"Algorithms to run (default: all of {', '.join(SOLVERS)}).")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help="Random seeds, one run each (default: 0).")
+    parser.add_argument('--time-budget', type=float, help="Seconds per run.")
+    parser.add_argument('--max-iterations', type=int, help="Iterations per run, in each algorithm's own unit.")
+    parser.add_argument('--gap-tolerance', type=float,
+                        help="Stop a run once within this share of the upper bound (needs a time budget or iterations).")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="Runs at the same time (default: number of CPUs).")
+    parser.add_argument('--assignments', action='store_true', help="Include every best plan's guest -> table array.")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Include every run's counters and phase timers (see metrics.py).")
+    parser.add_argument('--output', help="File to write the JSON lines to (default: standard output).")
+    parser.add_argument('--log-level', default='WARNING', help="Level of the optimizers' logs on standard error (default: WARNING).")
+    args = parser.parse_args(argv)
+    if args.gap_tolerance is not None and args.time_budget is None and args.max_iterations is None:
+        parser.error("--gap-tolerance needs --time-budget or --max-iterations")
+    return args
+
+
+def main(argv=None):
+    """Runs every job and writes one JSON line per finished run, as they finish. Returns the exit code."""
+    args = parse_args(argv)
+    logging.getLogger().setLevel(args.log_level.upper())
+    jobs = build_jobs(args)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    failed = 0
+    try:
+        if args.processes > 1:
+            pool = multiprocessing.Pool(min(args.processes, len(jobs)))
+            records = pool.imap_unordered(run_job, jobs)
+        else:
+            pool = None
+            records = map(run_job, jobs)
+        try:
+            for record in records:
+                failed += 'error' in record
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Benchmark suite: runs every algorithm on seeded synthetic instances and measures
+
+- throughput: work done per second, from the metrics counters (moves and swaps
+  scored, plans scored, guests placed; see metrics.Metrics)
+- time to target: seconds to get within target_gap of the instance's upper bound
+- peak memory: largest amount of memory the algorithm allocates on top of the instance
+- step time: seconds per simulated annealing step on a small instance, where the
+  fixed cost of a step outweighs the work it does
+
+Each measurement is repeated for several seeds and summarized by its median. The
+summary can be saved as a baseline JSON file, and later runs compared against it
+to catch performance regressions.
+
+Example:
+    python src/benchmark.py --guests 1000 10000 --seeds 0 1 2 --save-baseline baseline.json
+    python src/benchmark.py --guests 1000 10000 --seeds 0 1 2 --baseline baseline.json
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import metrics
+from budget import Budget
+from seating_plan import SeatingPlan
+from algorithms import SimulatedAnnealing
+from bounds import upper_bound, optimality_gap
+from synthetic import generate_instance
+from batch import SOLVERS
+
+
+# Counters that make up the work of a run (an algorithm only increments its own kind)
+WORK_COUNTERS = ('delta_evaluations', 'fitness_evaluations', 'placements')
+# Small instance of the step time measurement: guests, tables and seats per table,
+# the size of datasets/small.csv
+SMALL_INSTANCE = (20, 5, 4)
+# Fixed temperature of the timed steps, which accepts some worse moves and undoes others
+SMALL_INSTANCE_TEMP = 10.0
+
+
+def measure(guests, num_tables, table_capacity, algorithm, seed, time_limit, target_gap, memory_iterations):
+    """
+    Measures one algorithm on one instance with one seed.
+
+    The timed run stops at the time limit or once within target_gap of the upper
+    bound. Peak memory comes from a second, short run under tracemalloc, which would
+    slow the timed run down.
+
+    Returns:
+        dict: score, gap, time, iterations, work (see WORK_COUNTERS), throughput,
+              time_to_target (None if the target was not reached) and peak_memory (bytes)
+    """
+    solver = SOLVERS[algorithm]
+    bound = upper_bound(guests.preferences, table_capacity)
+
+    random.seed(seed)
+    with metrics.collecting() as collected:
+        start_time = time.perf_counter()
+        _, best_score, running = solver(guests, num_tables, table_capacity,
+                                        Budget(time_limit=time_limit, gap_tolerance=target_gap, upper_bound=bound))
+        elapsed = time.perf_counter() - start_time
+    work = sum(collected.counters.get(name, 0) for name in WORK_COUNTERS)
+    gap = optimality_gap(best_score, bound)
+
+    random.seed(seed)
+    tracemalloc.start()
+    try:
+        solver(guests, num_tables, table_capacity, Budget(max_iterations=memory_iterations))
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'score': int(best_score),
+        'gap': gap,
+        'time': elapsed,
+        'iterations': running.iteration,
+        'work': work,
+        'throughput': work / max(elapsed, 1e-9),
+        'time_to_target': elapsed if gap <= target_gap else None,
+        'peak_memory': peak_memory,
+    }
+
+
+def measure_step_time(instance_seed, seed, steps):
+    """
+    Seconds per simulated annealing step on the SMALL_INSTANCE, from `steps` steps
+    at a fixed temperature. Tables this small keep every step cheap, so this catches
+    fixed costs (array calls, copies) that throughput on large instances hides.
+    """
+    num_guests, num_tables, table_capacity = SMALL_INSTANCE
+    guests = generate_instance(num_guests, seed=instance_seed)
+    random.seed(seed)
+    annealer = SimulatedAnnealing(SeatingPlan(guests, num_tables, table_capacity))
+    start_time = time.perf_counter()
+    annealer.sweep(steps, SMALL_INSTANCE_TEMP)
+    return (time.perf_counter() - start_time) / steps
+
+
+def summarize(runs):
+    """Medians (and best score) over the runs of one algorithm on one instance."""
+    reached = [run['time_to_target'] for run in runs if run['time_to_target'] is not None]
+    return {
+        'runs': len(runs),
+        'best_score': max(run['score'] for run in runs),
+        'median_score': statistics.median(run['score'] for run in runs),
+        'median_gap': statistics.median(run['gap'] for run in runs),
+        'median_throughput': statistics.median(run['throughput'] for run in runs),
+        'reached_target': len(reached),
+        # Over the runs that reached the target, so check reached_target too
+        'median_time_to_target': statistics.median(reached) if reached else None,
+        'median_peak_memory': statistics.median(run['peak_memory'] for run in runs),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of results against a baseline (both as written by run_suite).
+
+    A regression is a median throughput lower than the baseline's by more than
+    `tolerance` (a share, e.g. 0.2), a median time to target, peak memory or small
+    instance step time higher by more than that, or fewer runs reaching the target.
+
+    Returns:
+        list of str: One line per regression
+    """
+    regressions = []
+    step_time, baseline_step_time = results.get('step_time'), baseline.get('step_time')
+    if step_time and baseline_step_time \
+            and step_time['median_seconds'] > baseline_step_time['median_seconds'] * (1 + tolerance):
+        regressions.append(f"small instance step time {step_time['median_seconds'] * 1e6:.1f}us "
+                           f"> baseline {baseline_step_time['median_seconds'] * 1e6:.1f}us")
+    for instance, algorithms in results['results'].items():
+        for algorithm, current in algorithms.items():
+            previous = baseline.get('results', {}).get(instance, {}).get(algorithm)
+            if previous is None or 'error' in previous or 'error' in current:
+                continue
+            where = f"{instance} {algorithm}"
+            if current['median_throughput'] < previous['median_throughput'] * (1 - tolerance):
+                regressions.append(f"{where}: throughput {current['median_throughput']:.0f}/s "
+                                   f"< baseline {previous['median_throughput']:.0f}/s")
+            if current['reached_target'] < previous['reached_target']:
+                regressions.append(f"{where}: {current['reached_target']} runs reached the target "
+                                   f"< baseline {previous['reached_target']}")
+            elif current['median_time_to_target'] is not None and previous['median_time_to_target'] is not None \
+                    and current['median_time_to_target'] > previous['median_time_to_target'] * (1 + tolerance):
+                regressions.append(f"{where}: time to target {current['median_time_to_target']:.3f}s "
+                                   f"> baseline {previous['median_time_to_target']:.3f}s")
+            if current['median_peak_memory'] > previous['median_peak_memory'] * (1 + tolerance):
+                regressions.append(f"{where}: peak memory {current['median_peak_memory'] / 2**20:.1f} MiB "
+                                   f"> baseline {previous['median_peak_memory'] / 2**20:.1f} MiB")
+    return regressions
+
+
+def run_suite(args, report=print):
+    """
+    Runs every (instance size, algorithm) pair for every seed, then times the
+    steps on the small instance (unless args.small_steps is 0).
+
+    Returns:
+        dict: {'config': the settings, 'results': {instance: {algorithm: summary}},
+               'step_time': {'median_seconds': ...} or None};
+              an algorithm that fails on an instance gets {'error': ...}
+    """
+    results = {}
+    for num_guests in args.guests:
+        guests = generate_instance(num_guests, args.avg_preferences, args.positive_share, args.group_size,
+                                   seed=args.instance_seed)
+        num_tables = math.ceil(num_guests / args.capacity)
+        instance = (f"n{num_guests}-d{args.avg_preferences:g}-p{args.positive_share:g}"
+                    f"-g{args.group_size}-s{args.instance_seed}")
+        results[instance] = {}
+        for algorithm in args.algorithms:
+            try:
+                runs = [measure(guests, num_tables, args.capacity, algorithm, seed, args.time_budget, args.target_gap,
+                                args.memory_iterations)
+                        for seed in args.seeds]
+                summary = summarize(runs)
+                report(f"{instance:<24} {algorithm:<20} score {summary['best_score']:>9} "
+                       f"gap {summary['median_gap']:6.3f}  {summary['median_throughput']:>12.0f}/s  "
+                       f"target {summary['reached_target']}/{summary['runs']}  "
+                       f"mem {summary['median_peak_memory'] / 2**20:8.1f} MiB")
+            except (MemoryError, ValueError) as error:
+                summary = {'error': f"{type(error).__name__}: {error}"}
+                report(f"{instance:<24} {algorithm:<20} {summary['error']}")
+            results[instance][algorithm] = summary
+
+    step_time = None
+    if args.small_steps:
+        step_time = {'median_seconds': statistics.median(measure_step_time(args.instance_seed, seed, args.small_steps)
+                                                         for seed in args.seeds)}
+        report(f"{'small instance':<24} {'simulated_annealing':<20} {step_time['median_seconds'] * 1e6:.1f}us/step")
+
+    config = {key: value for key, value in vars(args).items() if key not in ('baseline', 'save_baseline', 'output')}
+    return {'config': config, 'results': results, 'step_time': step_time}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the seating plan algorithms on synthetic instances.")
+    parser.add_argument('--guests', type=int, nargs='+', default=[1000, 10000], help="Instance sizes (default: 1000 10000).")
+    parser.add_argument('--avg-preferences', type=float, default=10, help="Preferences per guest (default: 10).")
+    parser.add_argument('--positive-share', type=float, default=0.7,
+                        help="Share of positive preferences outside a guest's group (default: 0.7).")
+    parser.add_argument('--group-size', type=int, default=8, help="Size of the hidden friend groups (default: 8).")
+    parser.add_argument('--capacity', type=int, default=10, help="Seats per table (default: 10).")
+    parser.add_argument('--instance-seed', type=int, default=0, help="Seed of the generated instances (default: 0).")
+    parser.add_argument('--algorithms', nargs='+', default=list(SOLVERS), choices=list(SOLVERS), metavar='NAME',
+                        help=f"Algorithms to measure (default: all of {', '.join(SOLVERS)}).")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2], help="Seeds of the repeated runs (default: 0 1 2).")
+    parser.add_argument('--time-budget', type=float, default=5.0, help="Seconds per timed run (default: 5).")
+    parser.add_argument('--target-gap', type=float, default=0.6,
+                        help="Optimality gap that counts as reaching the target (default: 0.6; the bound is loose on sparse instances).")
+    parser.add_argument('--memory-iterations', type=int, default=20,
+                        help="Iterations of the run measuring peak memory (default: 20).")
+    parser.add_argument('--small-steps', type=int, default=10000,
+                        help="Simulated annealing steps timed on a 20-guest instance (default: 10000; 0 skips it).")
+    parser.add_argument('--output', help="Write the results JSON here.")
+    parser.add_argument('--save-baseline', help="Write the results JSON here as the new baseline.")
+    parser.add_argument('--baseline', help="Baseline JSON to compare against; regressions make the exit code 1.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slack before a difference with the baseline is a regression (default: 0.2).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_suite(args)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+def upper_bound(preferences, table_capacity):
+    """
+    Upper bound on the score of any seating plan of an instance.
+
+    A guest sits with at most table_capacity - 1 others, so the score they take part
+    in is at most the sum of their table_capacity - 1 highest positive pair scores.
+    Every pair at a table is counted from both of its guests, hence the half. The
+    bound only costs a sort of the pair scores, so it can be computed before every run.
+
+    Args:
+        preferences: Preference backend of the instance (e.g. plan.preferences)
+        table_capacity: Seats per table
+
+    Returns:
+        int: No plan of the instance scores more than this
+    """
+    return int(preferences.top_pair_sums(table_capacity - 1).sum()) // 2
+
+
+def optimality_gap(score, bound):
+    """
+    How far a score may still be from the optimum, as a share of the upper bound.
+
+    Args:
+        score: Score of a plan
+        bound: Upper bound of the instance (see upper_bound)
+
+    Returns:
+        float: (bound - score) / bound, 0 once the score reaches the bound (bounds
+               below 1 count as 1, so instances without positive preferences work too)
+    """
+    return max(0.0, (bound - score) / max(abs(bound), 1))
@@ -0,0 +1,144 @@
+import copy
+import time
+from bounds import upper_bound as instance_upper_bound, optimality_gap
+
+
+class Budget:
+    """
+    Stopping rules shared by every optimizer's run(budget=...).
+
+    A run stops as soon as any of the given rules triggers, and returns the best
+    plan found so far:
+
+    - time_limit: seconds from the start of the run
+    - deadline: absolute wall-clock time (time.time()) to stop at
+    - max_iterations: iterations of the optimizer's main loop (swaps tried, tabu
+      iterations, generations, ...)
+    - target_score: stop once the best score reaches it
+    - stall_limit: stop after this many iterations without a new best score
+    - gap_tolerance: stop once the optimality gap of the best score (see
+      bounds.optimality_gap) is at most this, e.g. 0.01 for within 1% of the upper
+      bound. The bound is upper_bound if given, else computed from the instance
+      when the optimizer starts the budget
+    - cancel: anything with an is_set() method, e.g. a threading.Event; the run
+      stops once it is set (e.g. by a GUI's cancel button, from another thread)
+    - on_improvement: not a stopping rule, but called as on_improvement(iteration,
+      best_score) every time should_stop() sees a new best score, so a caller can
+      follow the run's progress (it runs in the optimizer's thread, so keep it quick)
+
+    start() returns a running copy that the optimizer polls with should_stop(); the
+    Budget itself is never modified, so one can be reused for several runs. A running
+    copy has its time limit folded into an absolute deadline, so it can be sent to
+    worker processes and restarted there without extending the time available.
+    Optimizers keep their running copy in self.budget, so stop_reason and the
+    optimality gap reached can be read after run().
+
+    Example:
+        best_plan, best_score = TabuSearch(plan).run(Budget(time_limit=2.0, stall_limit=500))
+    """
+
+    def __init__(self, time_limit=None, deadline=None, max_iterations=None, target_score=None, stall_limit=None,
+                 gap_tolerance=None, upper_bound=None, cancel=None, on_improvement=None):
+        # A cancel event alone is not enough: schedules such as annealing temperatures need an end
+        if time_limit is None and deadline is None and max_iterations is None and stall_limit is None:
+            raise ValueError("A budget needs a time limit, a deadline, an iteration cap or a stall limit.")
+        self.time_limit = time_limit
+        self.deadline = deadline
+        self.max_iterations = max_iterations
+        self.target_score = target_score
+        self.stall_limit = stall_limit
+        self.gap_tolerance = gap_tolerance
+        self.upper_bound = upper_bound
+        self.cancel = cancel
+        self.on_improvement = on_improvement
+
+        # Running state, set by start()
+        self.started = None
+        self.best_score = float('-inf')
+        self.last_improvement = 0
+        self.iteration = 0       # Last iteration count given to should_stop()
+        self.stop_reason = None  # 'cancelled', 'deadline', 'max_iterations', 'target_score', 'stall' or 'gap'
+
+    def start(self, preferences=None, table_capacity=None):
+        """
+        Returns a running copy of the budget, with its clock starting now.
+
+        Optimizers pass their instance (preference backend and table capacity) so a
+        gap tolerance without an explicit upper bound can compute one.
+        """
+        running = copy.copy(self)
+        if self.gap_tolerance is not None and self.upper_bound is None and preferences is not None:
+            running.upper_bound = instance_upper_bound(preferences, table_capacity)
+        running.started = time.time()
+        if self.time_limit is not None:
+            end = running.started + self.time_limit
+            running.deadline = end if self.deadline is None else min(self.deadline, end)
+            running.time_limit = None
+        running.best_score = float('-inf')
+        running.last_improvement = 0
+        running.iteration = 0
+        running.stop_reason = None
+        return running
+
+    def should_stop(self, iteration, best_score):
+        """
+        Whether the run must stop before its next iteration.
+
+        Args:
+            iteration: Number of iterations done so far
+            best_score: Best score found so far
+
+        Returns:
+            bool: True once any rule triggers; stop_reason then says which one
+        """
+        self.iteration = iteration
+        if best_score > self.best_score:
+            self.best_score = best_score
+            self.last_improvement = iteration
+            if self.on_improvement is not None:
+                self.on_improvement(iteration, best_score)
+        if self.cancel is not None and self.cancel.is_set():
+            self.stop_reason = 'cancelled'
+        elif self.target_score is not None and best_score >= self.target_score:
+            self.stop_reason = 'target_score'
+        elif self.gap_tolerance is not None and self.gap is not None and self.gap <= self.gap_tolerance:
+            self.stop_reason = 'gap'
+        elif self.max_iterations is not None and iteration >= self.max_iterations:
+            self.stop_reason = 'max_iterations'
+        elif self.stall_limit is not None and iteration - self.last_improvement >= self.stall_limit:
+            self.stop_reason = 'stall'
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.stop_reason = 'deadline'
+        return self.stop_reason is not None
+
+    @property
+    def gap(self):
+        """
+        Optimality gap of the best score seen by should_stop(), or None without an
+        upper bound. No valid plan scores above the bound, so a best score above it
+        (e.g. from a plan that seats a guest twice) also gives None rather than a
+        gap of 0 that would end the run with stop_reason 'gap'.
+        """
+        if self.upper_bound is None or self.best_score == float('-inf') or self.best_score > self.upper_bound:
+            return None
+        return optimality_gap(self.best_score, self.upper_bound)
+
+    def progress(self, iteration):
+        """
+        How far the run is through its budget, from 0 to 1, as the larger of the
+        iteration and time fractions (0 if neither is limited). Lets schedules such
+        as annealing temperatures follow a time budget as well as an iteration cap.
+        """
+        fractions = [0.0]
+        if self.max_iterations:
+            fractions.append(iteration / self.max_iterations)
+        if self.deadline is not None and self.started is not None:
+            total = self.deadline - self.started
+            fractions.append((time.time() - self.started) / total if total > 0 else 1.0)
+        return min(1.0, max(fractions))
+
+    def remaining(self):
+        """Seconds left before the deadline, or None if the budget has no deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
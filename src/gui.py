@@ -1,14 +1,30 @@
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
-from math import cos, sin, pi, ceil
-from algorithms import SimulatedAnnealing, HillClimbing, Greedy, TabuSearch, GeneticAlgorithm, KClustering
+from math import ceil
 import os
-from seating_plan import SeatingPlan
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from utils import read_input_csv
-from __init__ import run_all_algorithms  
+from budget import Budget
+from batch import SOLVERS, DEFAULT_ITERATIONS
+from seating_canvas import SeatingCanvas
 import time  
 
+# Algorithms offered by the GUI, by button label, and their runner (see batch.SOLVERS)
+ALGORITHMS = {
+    "Simulated Annealing": 'simulated_annealing',
+    "Hill Climbing": 'hill_climbing',
+    "Greedy": 'greedy',
+    "Tabu Search": 'tabu_search',
+    "Genetic Algorithm": 'genetic',
+    "k-clustering": 'k_clustering',
+}
+
+# Milliseconds between two reads of the progress queue while runs are going on
+POLL_INTERVAL = 100
+
 class SeatingPlanGUI:
     def __init__(self, root):
         self.root = root
@@ -57,8 +73,7 @@ class SeatingPlanGUI:
 
         self.selected_algorithm = None
         self.algorithm_buttons = {}
-        algorithms = ["Simulated Annealing", "Hill Climbing", "Greedy", "Tabu Search", "Genetic Algorithm", "k-clustering"]
-        for algorithm in algorithms:
+        for algorithm in ALGORITHMS:
             btn = tk.Button(self.algorithm_frame, text=algorithm, command=lambda alg=algorithm: self.select_algorithm(alg),
                             bg="#f8f9fa", fg="#343a40", font=("Arial", 10), relief=tk.RAISED, borderwidth=2)
             btn.pack(side=tk.LEFT, padx=5)
@@ -79,9 +94,22 @@ class SeatingPlanGUI:
             btn.pack(side=tk.LEFT, padx=5)
             self.run_mode_buttons[mode] = btn
         
-        # Run button
-        self.run_button = tk.Button(root, text="Run", command=self.run_algorithm, bg="#ff7f50", fg="black", font=("Arial", 12, "bold"))
-        self.run_button.pack(pady=10)
+        # Time limit of every run, which also stops at its algorithm's usual number of iterations
+        # (algorithms run side by side in "Run All Algorithms" mode)
+        self.time_limit_label = tk.Label(root, text="Time Limit (s):", bg="#e9ecef", font=("Arial", 12, "bold"), fg="#343a40")
+        self.time_limit_label.pack(pady=5)
+        self.time_limit_entry = tk.Entry(root, width=10, font=("Arial", 10))
+        self.time_limit_entry.insert(0, "10")
+        self.time_limit_entry.pack(pady=5)
+
+        # Run and cancel buttons
+        self.run_controls = tk.Frame(root, bg="#e9ecef")
+        self.run_controls.pack(pady=10)
+        self.run_button = tk.Button(self.run_controls, text="Run", command=self.run_algorithm, bg="#ff7f50", fg="black", font=("Arial", 12, "bold"))
+        self.run_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(self.run_controls, text="Cancel", command=self.cancel_runs, bg="#6c757d", fg="white",
+                                       font=("Arial", 12, "bold"), state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         
         # Stop button
         self.stop_button = tk.Button(root, text="X", command=self.stop_app, bg="#dc3545", fg="white", font=("Arial", 12, "bold"), borderwidth=0, highlightthickness=0)
@@ -92,16 +120,22 @@ class SeatingPlanGUI:
         self.canvas_frame = tk.Frame(root, bg="#e9ecef")
         self.canvas_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # Canvas for visualization with scrollbars
-        self.canvas = tk.Canvas(self.canvas_frame, bg="white", scrollregion=(0, 0, 2400, 2400))
+        # Total score of the shown plan, above the canvas so it stays in view
+        self.score_label = tk.Label(self.canvas_frame, text="", bg="#e9ecef", font=("Arial", 14, "bold"), fg="#343a40")
+        self.score_label.pack(side=tk.TOP)
+
+        # Canvas for visualization with scrollbars; SeatingCanvas only draws the visible
+        # tables, in detail or as one glyph each depending on the zoom
+        self.canvas = tk.Canvas(self.canvas_frame, bg="white")
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.seating_canvas = SeatingCanvas(self.canvas)
 
         # Vertical scrollbar
-        self.v_scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.v_scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.seating_canvas.yview)
         self.v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # Horizontal scrollbar
-        self.h_scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
+        self.h_scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.seating_canvas.xview)
         self.h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
 
         # Configure canvas to work with scrollbars
@@ -124,6 +158,17 @@ class SeatingPlanGUI:
             bg="#e9ecef", font=("Arial", 10), fg="#343a40", selectcolor="#ffffff"
         )
         self.file_output_checkbox.pack(pady=5)
+
+        # Background runs: the optimizers run in worker threads and report through
+        # self.progress, which the Tk main loop reads every POLL_INTERVAL ms
+        self.executor = None
+        self.progress = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.runs = {}          # algorithm -> status, score, iteration, time of the current runs
+        self.output_data = []   # (algorithm, score, time, plan) of the finished runs, for file output
+        self.poll_id = None
+        self.shown_score = None  # Score of the plan on the canvas
+        self.root.protocol("WM_DELETE_WINDOW", self.stop_app)
     
     def select_algorithm(self, algorithm):
         """Highlight the selected algorithm button."""
@@ -144,6 +189,9 @@ class SeatingPlanGUI:
         messagebox.showinfo("Dataset Selected", f"Loaded dataset: {os.path.basename(file_path)}")
     
     def run_algorithm(self):
+        """Starts the selected run mode in background threads; results come in through poll_progress."""
+        if self.executor is not None:
+            return
         if not self.selected_file:
             messagebox.showerror("Error", "Please select a dataset.")
             return
@@ -155,40 +203,57 @@ class SeatingPlanGUI:
             return
         
         num_tables = int(num_tables)
+
+        try:
+            time_limit = float(self.time_limit_entry.get())
+        except ValueError:
+            time_limit = 0
+        if time_limit <= 0:
+            messagebox.showerror("Error", "Please enter a valid time limit.")
+            return
+
+        # Check the selected run mode
+        run_mode = self.selected_run_mode
+        if run_mode == "Run All Algorithms":
+            algorithms = list(ALGORITHMS)
+        elif run_mode == "Run Selected Algorithm":
+            if not self.selected_algorithm:
+                messagebox.showerror("Error", "Please select an algorithm.")
+                return
+            algorithms = [self.selected_algorithm]
+        else:
+            messagebox.showerror("Error", "Please select a run mode.")
+            return
         
         try:
             guests = read_input_csv(self.selected_file)
-            table_capacity = max(2, ceil(len(guests) / num_tables))
-            
-            # Check the selected run mode
-            run_mode = self.selected_run_mode
-            output_data = []  # To store results for file output
-            # In the run_algorithm method, change these lines:
-            if run_mode == "Run All Algorithms":
-                results = []
-                for algorithm in self.algorithm_buttons.keys():
-                    best_plan, best_score, time_taken = self.run_selected_algorithm(algorithm, guests, num_tables, table_capacity)
-                    results.append([algorithm, best_score, time_taken, best_plan])
-                    output_data.append((algorithm, best_score, time_taken, best_plan))  # Now includes best_plan
-                self.display_results(results)
-                best_plan, best_score = results[0][3], results[0][1]
-                self.visualize_seating_plan(best_plan, best_score)
-            elif run_mode == "Run Selected Algorithm":
-                algorithm = self.selected_algorithm
-                if not algorithm:
-                    messagebox.showerror("Error", "Please select an algorithm.")
-                    return
-                
-                best_plan, best_score, time_taken = self.run_selected_algorithm(algorithm, guests, num_tables, table_capacity)
-                self.visualize_seating_plan(best_plan, best_score)
-                self.display_results([[algorithm, best_score, time_taken, best_plan]])
-                output_data.append((algorithm, best_score, time_taken, best_plan))  # Now includes best_plan
-            
-            # Write results to file if file output is enabled
-            if self.file_output_enabled.get():
-                self.write_results_to_file(output_data)
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
+            return
+        table_capacity = max(2, ceil(len(guests) / num_tables))
+
+        # A fresh event, since cancelling the previous runs left the old one set
+        self.progress = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.runs = {algorithm: {'status': "Running", 'score': None, 'iteration': 0, 'time': None}
+                     for algorithm in algorithms}
+        self.output_data = []
+        self.shown_score = None
+        self.score_label.config(text="")
+        self.seating_canvas.clear()
+        self.executor = ThreadPoolExecutor(max_workers=len(algorithms))
+        for algorithm in algorithms:
+            self.executor.submit(self.run_selected_algorithm, algorithm, guests, num_tables, table_capacity, time_limit)
+
+        self.run_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.display_results()
+        self.poll_id = self.root.after(POLL_INTERVAL, self.poll_progress)
+
+    def cancel_runs(self):
+        """Asks the running optimizers to stop; each still reports the best plan it found."""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
 
     def write_results_to_file(self, results):
         """Writes the results to a file in the output folder, including table assignments."""
@@ -219,110 +284,100 @@ class SeatingPlanGUI:
                 
                 f.write("\n" + "="*50 + "\n\n")  # Add separator between different algorithm results
     
-    def run_selected_algorithm(self, algorithm, guests, num_tables, table_capacity):
-        """Run the selected algorithm and return the best plan, score, and execution time."""
-        seating_plan = SeatingPlan(guests, num_tables=num_tables, table_capacity=table_capacity)
+    def run_selected_algorithm(self, algorithm, guests, num_tables, table_capacity, time_limit):
+        """
+        Runs one algorithm; called in a worker thread, so it reports through
+        self.progress instead of touching the widgets:
+        - ('progress', algorithm, iteration, best_score) on every new best score
+        - ('done', algorithm, best_plan, best_score, time, stop_reason) at the end
+        - ('error', algorithm, message) if the run failed
+        """
+        progress, cancel_event = self.progress, self.cancel_event
+        # The time limit comes on top of the algorithm's usual iteration cap, so quick runs stay quick
+        budget = Budget(
+            time_limit=time_limit,
+            max_iterations=DEFAULT_ITERATIONS[ALGORITHMS[algorithm]],
+            cancel=cancel_event,
+            on_improvement=lambda iteration, score: progress.put(('progress', algorithm, iteration, score)),
+        )
         start_time = time.time()  # Start timing
-        if algorithm == "Simulated Annealing":
-            optimizer = SimulatedAnnealing(seating_plan)
-            result = optimizer.run()
-        elif algorithm == "Hill Climbing":
-            optimizer = HillClimbing(seating_plan)
-            result = optimizer.run()
-        elif algorithm == "Greedy":
-            optimizer = Greedy(guests, num_tables=num_tables, table_capacity=table_capacity)
-            best_plan = optimizer.run()
-            # Fix score calculation for Greedy
-            best_score = sum(
-                guest.get_preference(other)
-                for table in best_plan
-                for guest in table.guests
-                for other in table.guests
-                if guest != other
-            )
-            result = (best_plan, best_score)
-        elif algorithm == "Tabu Search":
-            optimizer = TabuSearch(seating_plan)
-            result = optimizer.run()
-        elif algorithm == "k-clustering":
-            optimizer = KClustering(guests, num_tables=num_tables, table_capacity=table_capacity)
-            result = optimizer.run()  # Already returns (best_plan, best_score, execution_time)
-            return result  # Return directly for K-Clustering
-        elif algorithm == "Genetic Algorithm":
-            optimizer = GeneticAlgorithm(guests, num_tables=num_tables, table_capacity=table_capacity)
-            result = optimizer.run()
-        else:
-            raise ValueError("Invalid algorithm selected.")
-        end_time = time.time()  # End timing
-        execution_time = end_time - start_time
-        return result[0], result[1], execution_time  # Return plan, score, and time
+        try:
+            best_plan, best_score, running = SOLVERS[ALGORITHMS[algorithm]](guests, num_tables, table_capacity, budget)
+        except Exception as e:
+            progress.put(('error', algorithm, str(e)))
+            return
+        progress.put(('done', algorithm, best_plan, best_score, time.time() - start_time, running.stop_reason))
 
-    def display_results(self, results):
-        """Display the results of all algorithms in the results panel."""
+    def poll_progress(self):
+        """Applies what the worker threads reported since the last poll, and polls again until every run is over."""
+        self.poll_id = None
+        changed = False
+        while True:
+            try:
+                message = self.progress.get_nowait()
+            except queue.Empty:
+                break
+            kind, algorithm = message[:2]
+            run = self.runs[algorithm]
+            changed = True
+            if kind == 'progress':
+                run['iteration'], run['score'] = message[2], message[3]
+            elif kind == 'done':
+                best_plan, best_score, run['time'], stop_reason = message[2:]
+                run['score'] = best_score
+                run['status'] = "Cancelled" if stop_reason == 'cancelled' else "Done"
+                self.output_data.append((algorithm, best_score, run['time'], best_plan))
+                # The canvas shows the best plan finished so far
+                if self.shown_score is None or best_score > self.shown_score:
+                    self.shown_score = best_score
+                    self.visualize_seating_plan(best_plan, best_score)
+            else:
+                run['status'] = f"Error: {message[2]}"
+
+        if changed:
+            self.display_results()
+        if any(run['status'] == "Running" for run in self.runs.values()):
+            self.poll_id = self.root.after(POLL_INTERVAL, self.poll_progress)
+            return
+
+        # Every run is over
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        self.run_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if self.file_output_enabled.get() and self.output_data:
+            try:
+                self.write_results_to_file(self.output_data)
+            except OSError as e:
+                messagebox.showerror("Error", f"An error occurred: {e}")
+
+    def display_results(self):
+        """Display the status and best score of every current run in the results panel."""
         self.results_text.config(state=tk.NORMAL)
         self.results_text.delete(1.0, tk.END)  # Clear previous results
 
-        for result in results:
-            algorithm, best_score, time_taken, _ = result
+        for algorithm, run in self.runs.items():
             self.results_text.insert(tk.END, f"Algorithm: {algorithm}\n")
-            self.results_text.insert(tk.END, f"Best Score: {best_score}\n")
-            self.results_text.insert(tk.END, f"Time Taken: {time_taken:.2f} seconds\n")
+            self.results_text.insert(tk.END, f"Status: {run['status']}\n")
+            self.results_text.insert(tk.END, f"Best Score: {run['score'] if run['score'] is not None else '-'}\n")
+            if run['time'] is not None:
+                self.results_text.insert(tk.END, f"Time Taken: {run['time']:.2f} seconds\n")
+            else:
+                self.results_text.insert(tk.END, f"Iteration: {run['iteration']}\n")
             self.results_text.insert(tk.END, "-" * 30 + "\n")
 
         self.results_text.config(state=tk.DISABLED)
     
     def stop_app(self):
-        """Stops the application."""
+        """Stops the application, cancelling the runs still going on."""
+        self.cancel_event.set()
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
         self.root.destroy()
 
     def visualize_seating_plan(self, seating_plan, total_score):
-        self.canvas.delete("all")  # Clear the canvas
-
-        # Display total score at the top of the canvas
-        self.canvas.create_text(1200, 30, text=f"Total Score: {total_score}", font=("Arial", 14, "bold"), fill="#343a40")
-
-        # Get canvas dimensions and adjust scroll region
-        canvas_width = 2400
-        canvas_height = 2400
-        self.canvas.config(scrollregion=(0, 0, canvas_width, canvas_height))
-
-        tables = seating_plan.tables if hasattr(seating_plan, 'tables') else seating_plan
-
-        # Calculate grid dimensions for table placement
-        num_tables = len(tables)
-        aspect_ratio = canvas_width / canvas_height
-        grid_cols = int((num_tables * aspect_ratio) ** 0.5)
-        grid_rows = (num_tables + grid_cols - 1) // grid_cols
-
-        # Adjust table radius and spacing
-        table_radius = min(50, min(canvas_width // (grid_cols * 4), canvas_height // (grid_rows * 4)))
-        spacing_x = canvas_width // grid_cols
-        spacing_y = canvas_height // grid_rows
-
-        for i, table in enumerate(tables):
-            col, row = i % grid_cols, i // grid_cols
-            table_x = spacing_x // 2 + col * spacing_x
-            table_y = spacing_y // 2 + row * spacing_y
-
-            # Draw table (circle)
-            self.canvas.create_oval(
-                table_x - table_radius, table_y - table_radius,
-                table_x + table_radius, table_y + table_radius,
-                fill="#FF6347", outline="black", width=2
-            )
-            self.canvas.create_text(table_x, table_y, text=f"Table {i+1}", font=("Arial", 10, "bold"), fill="white")
-
-            # Adjust seat placement radius to avoid overlapping
-            seat_radius = table_radius + 30
-            for j, guest in enumerate(table.guests):
-                angle = 2 * pi * j / len(table.guests)
-                guest_x = table_x + seat_radius * cos(angle)
-                guest_y = table_y + seat_radius * sin(angle)
-                guest_number = ''.join(filter(str.isdigit, guest.name))
-                self.canvas.create_oval(
-                    guest_x - 15, guest_y - 15,
-                    guest_x + 15, guest_y + 15,
-                    fill="#87CEEB", outline="black"
-                )
-                self.canvas.create_text(guest_x, guest_y, text=guest_number, font=("Arial", 8, "bold"), fill="black")
-
+        """Shows a SeatingPlan; only the tables it changed are redrawn if the same tables are already shown."""
+        self.score_label.config(text=f"Total Score: {total_score}")
+        self.seating_canvas.show(seating_plan)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from seating_plan import Guest
+from preferences import GuestList, SparsePreferences, DensePreferences, build_preferences, choose_backend
+
+# Bump when the layout of a compiled instance changes, so old caches are ignored
+FORMAT_VERSION = 1
+CACHE_DIR_NAME = 'seating-planner'
+
+
+def file_hash(file_path):
+    """SHA-256 of a file's content (plus the format version), used as the cache key."""
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}:".encode())
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    """
+    Compiled instances live in the user's cache directory (%LOCALAPPDATA% on Windows,
+    $XDG_CACHE_HOME or ~/.cache elsewhere), never next to the datasets themselves.
+    """
+    base = os.environ.get('LOCALAPPDATA') if os.name == 'nt' else os.environ.get('XDG_CACHE_HOME')
+    base = base or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, CACHE_DIR_NAME, 'instances')
+
+
+def compile_instance(file_path, cache_dir=None):
+    """
+    Compiles a preferences CSV file into the binary cache format, if not done yet.
+
+    A compiled instance is a folder named after the file's content hash with:
+    - names.json: guest names, indexed by guest id
+    - one .npy file per array of the sparse (CSR) preference backend
+
+    Returns:
+        str: Path to the compiled instance folder
+    """
+    from utils import parse_preferences_csv
+
+    cache_dir = cache_dir or default_cache_dir()
+    instance_dir = os.path.join(cache_dir, file_hash(file_path))
+    if os.path.isdir(instance_dir):
+        return instance_dir
+
+    names, rows, cols, values = parse_preferences_csv(file_path)
+    guests = [Guest(name, idx) for idx, name in enumerate(names)]
+    store = build_preferences(guests, rows, cols, values, SparsePreferences)
+
+    # Write everything in a temporary folder and rename it, so a crash or a
+    # concurrent run never leaves a half-written instance behind
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        with open(os.path.join(tmp_dir, 'names.json'), 'w') as file:
+            json.dump(names, file)
+        for name, array in store.to_arrays().items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        os.rename(tmp_dir, instance_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(instance_dir):
+            raise
+    return instance_dir
+
+
+def load_compiled(instance_dir, backend=None):
+    """
+    Loads a compiled instance, memory-mapping its arrays instead of reading them.
+
+    Args:
+        instance_dir: Folder returned by compile_instance
+        backend: DensePreferences or SparsePreferences, chosen automatically if None
+
+    Returns:
+        GuestList: The guests, carrying their preference backend
+    """
+    with open(os.path.join(instance_dir, 'names.json')) as file:
+        names = json.load(file)
+    guests = [Guest(name, idx) for idx, name in enumerate(names)]
+    arrays = {
+        name: np.load(os.path.join(instance_dir, f"{name}.npy"), mmap_mode='r')
+        for name in SparsePreferences.ARRAY_NAMES
+    }
+    store = SparsePreferences.from_arrays(guests, arrays)
+
+    if backend is None:
+        backend = choose_backend(len(guests), store.num_pairs)
+    if backend is DensePreferences:
+        store = DensePreferences.from_sparse(store)
+    return GuestList(guests, store)
+
+
+def load_instance(file_path, backend=None, cache_dir=None):
+    """Reads a preferences CSV file through the binary cache, compiling it on first use."""
+    return load_compiled(compile_instance(file_path, cache_dir), backend)
@@ -1,7 +1,6 @@
 # from utils import read_input_csv, write_output_csv
 # from __init__ import run_all_algorithms
-import tkinter as tk
-import gui
+import sys
 
 
 # def main():
@@ -29,6 +28,13 @@ import gui
 #     main()
 
 if __name__ == "__main__":
+    # With arguments, run headlessly (see batch.py); tkinter is only loaded for the GUI
+    if len(sys.argv) > 1:
+        import batch
+        sys.exit(batch.main())
+
+    import tkinter as tk
+    import gui
     root = tk.Tk()
     app = gui.SeatingPlanGUI(root)
     root.mainloop()
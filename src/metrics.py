@@ -0,0 +1,159 @@
+"""
+Counters and phase timers shared by every optimizer, off by default.
+
+While collection is off, current() is None: instrumented code checks it once per
+run (or once per call for the few counted SeatingPlan methods) and does nothing
+else, and the timers are a shared no-op context. The hot loops themselves are
+never instrumented; they keep plain local counts and add them when the run ends.
+
+Collection is per thread: a Metrics started in one thread only sees the runs made
+in that thread, so optimizers running side by side (e.g. the GUI's threaded runs)
+never mix their counts.
+
+Example:
+    with metrics.collecting() as collected:
+        TabuSearch(plan).run()
+    print(collected.to_json())
+    collected.to_trace('tabu.trace.json')  # open in Perfetto or chrome://tracing
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# The Metrics each thread is collecting into, as its 'active' attribute
+_state = threading.local()
+
+# Trace events kept at most, so long runs with many timed phases stay bounded
+MAX_TRACE_EVENTS = 100000
+
+_NO_TIMER = nullcontext()
+
+
+class Metrics:
+    """
+    Counters and per-phase timers of the runs made while it is active.
+
+    Counters used by the optimizers:
+    - score_calls: full plan scores (SeatingPlan.score())
+    - delta_evaluations: candidate moves and swaps whose score change was computed
+    - fitness_evaluations: plans scored by the genetic algorithms
+    - plan_copies: SeatingPlan.copy() calls
+    - accepted_moves, rejected_moves: outcome of the evaluated candidates
+    - cache_hits, cache_misses: fitness cache lookups
+    - placements: guests seated at a table by greedy and k-clustering
+
+    Timers are named '<optimizer>.<phase>' and keep their number of calls and total
+    seconds. Every timed phase is also kept as a trace event (up to MAX_TRACE_EVENTS).
+
+    Only this process is measured: work done in pool workers (islands, replicas)
+    counts where the parent process sees its results, if at all.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}   # name -> [calls, seconds]
+        self.events = []   # (name, start, duration, thread id), times from time.perf_counter()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            totals = self.timers.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((name, start, duration, threading.get_ident()))
+
+    def to_dict(self):
+        return {
+            'counters': dict(self.counters),
+            'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()},
+        }
+
+    def to_json(self, path=None):
+        """Counters and timer totals as JSON text, also written to path if given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def to_trace(self, path):
+        """
+        Writes the timed phases in the Chrome trace event format, which Perfetto,
+        chrome://tracing and speedscope open as a timeline or flame chart. Nested
+        phases (e.g. a generation's fitness inside the run) show up as a stack.
+        """
+        pid = os.getpid()
+        events = [
+            {'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+            for name, start, duration, tid in self.events
+        ]
+        events.extend({'name': name, 'ph': 'C', 'ts': time.perf_counter() * 1e6, 'pid': pid, 'args': {'value': value}}
+                      for name, value in self.counters.items())
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+def current():
+    """The Metrics this thread is collecting into, or None while collection is off."""
+    return getattr(_state, 'active', None)
+
+
+def enable():
+    """Starts collecting into a new Metrics in this thread, which is returned."""
+    _state.active = Metrics()
+    return _state.active
+
+
+def disable():
+    """Stops collecting in this thread. Returns the Metrics collected so far (or None)."""
+    collected, _state.active = current(), None
+    return collected
+
+
+@contextmanager
+def collecting():
+    """Collects into a new Metrics for the duration of a with block, then restores the previous state."""
+    previous = current()
+    _state.active = collected = Metrics()
+    try:
+        yield collected
+    finally:
+        _state.active = previous
+
+
+def count(name, amount=1):
+    """Adds to a counter, if collection is on."""
+    active = current()
+    if active is not None:
+        active.count(name, amount)
+
+
+def timer(name):
+    """Context manager timing a phase, if collection is on (a shared no-op otherwise)."""
+    active = current()
+    return active.timer(name) if active is not None else _NO_TIMER
+
+
+def timed(name):
+    """Decorator timing every call of a function (e.g. an optimizer's run) as a phase."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active = current()
+            if active is None:
+                return function(*args, **kwargs)
+            with active.timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+import copy
+import os
+import random
+import threading
+import time
+import multiprocessing
+from seating_plan import SeatingPlan
+from preferences import GuestList, preferences_for
+from shared_preferences import SharedInstance, attach
+from budget import Budget
+from bounds import optimality_gap
+from algorithms import HillClimbing, SimulatedAnnealing, TabuSearch
+
+# Optimizers the portfolio can run, by name. Each one takes a starting SeatingPlan
+# (plus keyword settings) and its run(budget=None) returns (best_plan, best_score).
+OPTIMIZERS = {
+    'hill_climbing': HillClimbing,
+    'simulated_annealing': SimulatedAnnealing,
+    'tabu_search': TabuSearch,
+}
+
+# Seconds the portfolio waits past its deadline for runs to send back their best plans
+RESULT_GRACE_SECONDS = 2.0
+# Seconds between two checks of the budget's cancel event while the runs go on
+CANCEL_POLL_SECONDS = 0.1
+
+
+def _run_one(task):
+    """
+    Worker: one independently seeded run from a fresh random plan.
+
+    Args:
+        task: (handle, optimizer name, settings, num_tables, table_capacity, seed, budget)
+              where budget is a started Budget or None for the optimizer's default
+
+    Returns:
+        dict with the seed, score, assignment of the best plan and run time
+    """
+    handle, name, settings, num_tables, table_capacity, seed, budget = task
+    start_time = time.time()
+    random.seed(seed)
+    guests = attach(handle)
+    plan = SeatingPlan(guests, num_tables, table_capacity)
+    best_plan, best_score = OPTIMIZERS[name](plan, **settings).run(budget)
+    return {
+        'seed': seed,
+        'score': int(best_score),
+        'assignment': best_plan.assignment,
+        'time': time.time() - start_time,
+    }
+
+
+class Portfolio:
+    def __init__(self, guests, num_tables, table_capacity, optimizer='hill_climbing', runs=None, processes=None,
+                 time_budget=None, target_score=None, **settings):
+        """
+        Multi-start portfolio: independently seeded runs of one local search
+        optimizer in a process pool, keeping the best plan any of them finds.
+
+        Parameters:
+        - guests: List of all guests.
+        - num_tables: Total number of tables.
+        - table_capacity: Maximum number of guests per table.
+        - optimizer: Name of the optimizer in OPTIMIZERS.
+        - runs: Number of runs (defaults to the number of CPUs).
+        - processes: Size of the process pool (defaults to the number of runs,
+          capped at the number of CPUs).
+        - time_budget: Wall-clock seconds for the whole portfolio. Every run stops at
+          the deadline and sends back its best plan so far.
+        - target_score: Cancel the remaining runs as soon as one reaches this score.
+        - settings: Keyword arguments for the optimizer (e.g. max_iterations).
+        """
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer '{optimizer}', expected one of {', '.join(OPTIMIZERS)}.")
+        if not isinstance(guests, GuestList):
+            guests = GuestList(guests, preferences_for(guests))
+        self.guests = guests
+        self.num_tables = num_tables
+        self.table_capacity = table_capacity
+        self.optimizer = optimizer
+        self.runs = runs or os.cpu_count() or 1
+        self.processes = processes or min(self.runs, os.cpu_count() or 1)
+        self.time_budget = time_budget
+        self.target_score = target_score
+        self.settings = settings
+        self.results = []       # Finished runs, in completion order (see _run_one)
+        self.cancelled = 0      # Runs stopped by the time budget or the target score
+
+    def _reached_target(self, target_score, budget):
+        if target_score is not None and any(r['score'] >= target_score for r in self.results):
+            return True
+        # A run within the gap tolerance makes the others pointless too
+        return (budget is not None and budget.gap_tolerance is not None and budget.upper_bound is not None
+                and any(optimality_gap(r['score'], budget.upper_bound) <= budget.gap_tolerance for r in self.results))
+
+    def run(self, budget=None):
+        """
+        Launches every run and waits for them, the time budget or the target score.
+
+        Parameters:
+        - budget: Budget given to every run, its deadline being shared by all of them.
+          Defaults to time_budget and target_score when time_budget is set, and to
+          each optimizer's own iteration count otherwise. Its cancel event stops
+          every run, and its on_improvement is called here with the number of
+          finished runs each time one of them beats the best score so far.
+
+        Returns:
+        - (best_plan, best_score) over the finished runs; (None, -inf) if no run
+          finished within the time budget.
+        """
+        if budget is None and self.time_budget is not None:
+            budget = Budget(time_limit=self.time_budget, target_score=self.target_score)
+        # Started here so every run shares the same absolute deadline (and upper bound)
+        budget = budget and budget.start(self.guests.preferences, self.table_capacity)
+        deadline = budget and budget.deadline
+        target_score = budget.target_score if budget else self.target_score
+        cancel = budget and budget.cancel
+        on_improvement = budget and budget.on_improvement
+        # Events and callbacks cannot be pickled, so the runs get a budget without
+        # them: the portfolio watches the cancel event and reports new bests itself
+        task_budget = budget
+        if cancel is not None or on_improvement is not None:
+            task_budget = copy.copy(budget)
+            task_budget.cancel = task_budget.on_improvement = None
+        seeds = [random.getrandbits(32) for _ in range(self.runs)]
+        self.results = []
+        finished = threading.Event()
+
+        def collect(result):
+            best_score = max((r['score'] for r in self.results), default=float('-inf'))
+            self.results.append(result)
+            if on_improvement is not None and result['score'] > best_score:
+                on_improvement(len(self.results), result['score'])
+            if len(self.results) == self.runs or self._reached_target(target_score, budget):
+                finished.set()
+
+        with SharedInstance(self.guests) as shared:
+            pool = multiprocessing.Pool(self.processes)
+            try:
+                errors = []
+                for seed in seeds:
+                    task = (shared.handle, self.optimizer, self.settings, self.num_tables, self.table_capacity, seed,
+                            task_budget)
+                    pool.apply_async(_run_one, (task,), callback=collect,
+                                     error_callback=lambda error: (errors.append(error), finished.set()))
+                if cancel is None:
+                    finished.wait(None if deadline is None else max(0.0, deadline - time.time()) + RESULT_GRACE_SECONDS)
+                else:
+                    end = None if deadline is None else deadline + RESULT_GRACE_SECONDS
+                    while not finished.wait(CANCEL_POLL_SECONDS) and not cancel.is_set():
+                        if end is not None and time.time() >= end:
+                            break
+                if errors:
+                    raise errors[0]
+            finally:
+                # Stops the runs still going, whether the budget expired or the target was met
+                pool.terminate()
+                pool.join()
+        self.cancelled = self.runs - len(self.results)
+
+        if not self.results:
+            return None, float('-inf')
+        best = max(self.results, key=lambda r: r['score'])
+        best_plan = SeatingPlan.from_assignment(self.guests, best['assignment'], self.num_tables, self.table_capacity)
+        return best_plan, best['score']
@@ -0,0 +1,456 @@
+import numpy as np
+
+# Up to this many guests the dense matrix is always used (at most ~16 MB)
+DENSE_ALWAYS_MAX_GUESTS = 2000
+# The dense matrix is never used above this size, whatever the density
+DENSE_MAX_BYTES = 256 * 1024 * 1024
+# Between the two limits, the dense matrix is only worth it for fairly dense preference graphs
+DENSE_MIN_DENSITY = 0.01
+# Pair scores DensePreferences.top_pair_sums materializes at a time (32 MB of int64)
+PAIR_CHUNK_ELEMENTS = 1 << 22
+
+
+class DensePreferences:
+    """
+    Dense preference backend: every guest gets an integer id and preferences
+    live in an int32 matrix indexed by those ids.
+
+    matrix[i, j] is how much guest i likes guest j (0 when no preference was given).
+    The Guest objects stay the public object model; this class is what the
+    seating plans use to score tables with vectorized gathers.
+    """
+
+    def __init__(self, guests, matrix):
+        """
+        Args:
+            guests: Guest objects ordered by id (guests[i].id == i)
+            matrix: Square int32 array of shape (len(guests), len(guests))
+        """
+        self.guests = list(guests)
+        self.matrix = np.asarray(matrix, dtype=np.int32)
+        _bind_guests(self)
+
+    @classmethod
+    def from_guests(cls, guests):
+        """Builds the matrix from the Guest.preferences dictionaries, assigning ids if needed."""
+        guests, rows, cols, values = _triplets_from_guests(guests)
+        return cls.from_triplets(guests, rows, cols, values)
+
+    @classmethod
+    def from_triplets(cls, guests, rows, cols, values):
+        """Builds the matrix from (guest id, other guest id, score) triplets."""
+        matrix = np.zeros((len(guests), len(guests)), dtype=np.int32)
+        matrix[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = values
+        # A guest never contributes to the score with themselves
+        np.fill_diagonal(matrix, 0)
+        return cls(guests, matrix)
+
+    @classmethod
+    def from_sparse(cls, sparse):
+        """Expands a SparsePreferences backend into a dense matrix."""
+        num_guests = len(sparse)
+        matrix = np.zeros((num_guests, num_guests), dtype=np.int32)
+        matrix[sparse.rows, sparse.indices] = sparse.data
+        return cls(sparse.guests, matrix)
+
+    def to_arrays(self):
+        """The arrays that fully describe this backend, by name (see from_arrays)."""
+        return {'matrix': self.matrix}
+
+    @classmethod
+    def from_arrays(cls, guests, arrays):
+        """Rebuilds the backend around existing arrays (e.g. memory-mapped), without copying them."""
+        return cls(guests, arrays['matrix'])
+
+    def __len__(self):
+        return len(self.guests)
+
+    @property
+    def num_pairs(self):
+        """Number of (guest, other guest) preferences that are not zero."""
+        return int(np.count_nonzero(self.matrix))
+
+    def get(self, guest_id, other_id):
+        """Preference of one guest for another, by id."""
+        return int(self.matrix[guest_id, other_id])
+
+    def triplets(self):
+        """Every non-zero preference as (guest ids, other guest ids, scores) arrays."""
+        rows, cols = np.nonzero(self.matrix)
+        return rows, cols, self.matrix[rows, cols]
+
+    def set(self, guest_id, other_id, score):
+        if guest_id != other_id:
+            self.matrix[guest_id, other_id] = score
+
+    def row(self, guest_id):
+        """Ids of the guests this guest has a preference for, and those preferences."""
+        cols = np.flatnonzero(self.matrix[guest_id])
+        return cols, self.matrix[guest_id, cols]
+
+    def pair_values(self, guest_id, ids):
+        """Pair scores (both directions) between one guest and each of the given guests."""
+        ids = np.asarray(ids, dtype=np.intp)
+        return self.matrix[guest_id, ids].astype(np.int64) + self.matrix[ids, guest_id]
+
+    def pair_list(self, guest_id, ids):
+        """
+        pair_values for a handful of guests given as a list of ids, as a list of ints.
+        Reads the matrix one item at a time, which beats a vectorized gather for the
+        few guests of a table.
+        """
+        item = self.matrix.item
+        return [item(guest_id, other_id) + item(other_id, guest_id) for other_id in ids]
+
+    def affinity(self, guest_id, ids):
+        """
+        Score a guest exchanges with a group of guests, counting both directions
+        (what the guest gives to them plus what they give back).
+        """
+        return int(self.pair_values(guest_id, ids).sum())
+
+    def table_affinities(self, guest_id, assignment, num_tables):
+        """Affinity of one guest with the guests at every table, as an array indexed by table."""
+        seated = assignment >= 0
+        row = self.matrix[guest_id].astype(np.int64) + self.matrix[:, guest_id]
+        return np.bincount(assignment[seated], weights=row[seated], minlength=num_tables).astype(np.int64)
+
+    def table_affinity_matrix(self, assignment, num_tables):
+        """Affinity of every guest with the guests at every table, as a (guests, tables) array."""
+        matrix = np.zeros((len(self.guests), num_tables), dtype=np.int64)
+        for table_idx in range(num_tables):
+            members = np.flatnonzero(assignment == table_idx)
+            matrix[:, table_idx] = self.matrix[:, members].sum(axis=1, dtype=np.int64)
+            matrix[:, table_idx] += self.matrix[members].sum(axis=0, dtype=np.int64)
+        return matrix
+
+    def pair_row(self, guest_id):
+        """Ids of the guests with a non-zero pair score with this guest, and those scores."""
+        row = self.matrix[guest_id].astype(np.int64) + self.matrix[:, guest_id]
+        ids = np.flatnonzero(row)
+        return ids, row[ids]
+
+    def pairs(self, ids1, ids2):
+        """Pair scores of many (guest, other guest) couples at once, element-wise."""
+        return self.matrix[ids1, ids2].astype(np.int64) + self.matrix[ids2, ids1]
+
+    def top_pair_sums(self, k):
+        """
+        Sum of the k highest positive pair scores of every guest, as an array indexed by guest id.
+
+        Works through a few rows of the pair matrix at a time, so memory stays at
+        about PAIR_CHUNK_ELEMENTS scores on top of the matrix itself.
+        """
+        num_guests = len(self.guests)
+        sums = np.zeros(num_guests, dtype=np.int64)
+        k = min(k, num_guests)
+        if k <= 0:
+            return sums
+        chunk = max(1, PAIR_CHUNK_ELEMENTS // max(num_guests, 1))
+        for start in range(0, num_guests, chunk):
+            stop = min(start + chunk, num_guests)
+            pair = self.matrix[start:stop].astype(np.int64)
+            pair += self.matrix[:, start:stop].T
+            pair[np.arange(stop - start), np.arange(start, stop)] = 0
+            # Scores are negated so that the k highest come first
+            np.negative(pair, out=pair)
+            top = np.partition(pair, k - 1, axis=1)[:, :k]
+            sums[start:stop] = np.maximum(-top, 0).sum(axis=1)
+        return sums
+
+    def in_table_affinities(self, slots, assignment):
+        """Affinity of every guest with their own tablemates, as an array indexed by guest id."""
+        occupied = slots >= 0
+        ids = np.where(occupied, slots, 0)
+        block = self.matrix[ids[:, :, None], ids[:, None, :]].astype(np.int64)
+        block += block.transpose(0, 2, 1)
+        pair_mask = occupied[:, :, None] & occupied[:, None, :]
+        affinities = np.zeros(len(self.guests), dtype=np.int64)
+        affinities[slots[occupied]] = block.sum(axis=2, where=pair_mask)[occupied]
+        return affinities
+
+    def pair(self, guest_id, other_id):
+        """Score two guests produce when seated together."""
+        return self.matrix.item(guest_id, other_id) + self.matrix.item(other_id, guest_id)
+
+
+class SparsePreferences:
+    """
+    Sparse preference backend for large events, in compressed sparse row (CSR) form.
+
+    The preferences of guest i are the ids indices[indptr[i]:indptr[i + 1]] (sorted)
+    with scores data[indptr[i]:indptr[i + 1]]. A second CSR structure (pair_*) holds
+    the symmetric pair scores preference(i, j) + preference(j, i), which is what
+    the delta evaluations need. Memory grows with the number of preferences
+    instead of the square of the number of guests.
+    """
+
+    ARRAY_NAMES = ('indptr', 'indices', 'data', 'rows', 'pair_indptr', 'pair_indices', 'pair_data')
+
+    def __init__(self, guests, indptr, indices, data, pair_indptr, pair_indices, pair_data, rows=None):
+        self.guests = list(guests)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.pair_indptr = pair_indptr
+        self.pair_indices = pair_indices
+        self.pair_data = pair_data
+        # Row of every stored preference, so whole-plan scores are a single masked sum
+        if rows is None:
+            rows = np.repeat(np.arange(len(self.guests), dtype=np.int32), np.diff(indptr))
+        self.rows = rows
+        self._pair_keys = None  # Built by pairs() on first use
+        self._pair_dicts = {}   # Guest id -> {other guest id: pair score}, built by pair_list() on first use
+        _bind_guests(self)
+
+    def to_arrays(self):
+        """The arrays that fully describe this backend, by name (see from_arrays)."""
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, guests, arrays):
+        """Rebuilds the backend around existing arrays (e.g. memory-mapped), without copying them."""
+        return cls(guests, **{name: arrays[name] for name in cls.ARRAY_NAMES})
+
+    @classmethod
+    def from_guests(cls, guests):
+        """Builds the CSR arrays from the Guest.preferences dictionaries, assigning ids if needed."""
+        guests, rows, cols, values = _triplets_from_guests(guests)
+        return cls.from_triplets(guests, rows, cols, values)
+
+    @classmethod
+    def from_triplets(cls, guests, rows, cols, values):
+        """Builds the CSR arrays from (guest id, other guest id, score) triplets."""
+        num_guests = len(guests)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int32)
+        # A guest never contributes to the score with themselves
+        keep = (rows != cols) & (values != 0)
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+
+        indptr, indices, data = _to_csr(num_guests, rows, cols, values)
+        pair_indptr, pair_indices, pair_data = _to_csr(
+            num_guests,
+            np.concatenate([rows, cols]),
+            np.concatenate([cols, rows]),
+            np.concatenate([values, values]),
+        )
+        return cls(guests, indptr, indices, data, pair_indptr, pair_indices, pair_data)
+
+    def __len__(self):
+        return len(self.guests)
+
+    @property
+    def num_pairs(self):
+        """Number of (guest, other guest) preferences that are not zero."""
+        return len(self.data)
+
+    def _lookup(self, indptr, indices, data, guest_id, ids):
+        """Values of row guest_id at the columns ids (0 where nothing is stored)."""
+        start, end = indptr[guest_id], indptr[guest_id + 1]
+        ids = np.asarray(ids, dtype=np.int64)
+        if start == end:
+            return np.zeros(len(ids), dtype=np.int32)
+        cols = indices[start:end]
+        # Rows are sorted by column, so each id is found by binary search
+        pos = np.minimum(np.searchsorted(cols, ids), end - start - 1)
+        return np.where(cols[pos] == ids, data[start:end][pos], 0)
+
+    def get(self, guest_id, other_id):
+        """Preference of one guest for another, by id."""
+        return int(self._lookup(self.indptr, self.indices, self.data, guest_id, [other_id])[0])
+
+    def triplets(self):
+        """Every non-zero preference as (guest ids, other guest ids, scores) arrays."""
+        return self.rows, self.indices, self.data
+
+    def set(self, guest_id, other_id, score):
+        raise ValueError("Sparse preferences are read-only; build a new store to change them.")
+
+    def row(self, guest_id):
+        """Ids of the guests this guest has a preference for, and those preferences."""
+        start, end = self.indptr[guest_id], self.indptr[guest_id + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def pair_values(self, guest_id, ids):
+        """Pair scores (both directions) between one guest and each of the given guests."""
+        return self._lookup(self.pair_indptr, self.pair_indices, self.pair_data, guest_id, ids).astype(np.int64)
+
+    def pair_list(self, guest_id, ids):
+        """
+        pair_values for a handful of guests given as a list of ids, as a list of ints.
+        Looks them up in a dict of the guest's pair scores, built on first use and
+        kept (about 100 bytes per pair score), which beats a vectorized binary search
+        for the few guests of a table.
+        """
+        row = self._pair_dicts.get(guest_id)
+        if row is None:
+            start, end = self.pair_indptr[guest_id], self.pair_indptr[guest_id + 1]
+            row = dict(zip(self.pair_indices[start:end].tolist(), self.pair_data[start:end].tolist()))
+            self._pair_dicts[guest_id] = row
+        return [row.get(other_id, 0) for other_id in ids]
+
+    def affinity(self, guest_id, ids):
+        """
+        Score a guest exchanges with a group of guests, counting both directions
+        (what the guest gives to them plus what they give back).
+        """
+        return int(self.pair_values(guest_id, ids).sum())
+
+    def table_affinities(self, guest_id, assignment, num_tables):
+        """Affinity of one guest with the guests at every table, as an array indexed by table."""
+        start, end = self.pair_indptr[guest_id], self.pair_indptr[guest_id + 1]
+        tables = assignment[self.pair_indices[start:end]]
+        seated = tables >= 0
+        return np.bincount(tables[seated], weights=self.pair_data[start:end][seated], minlength=num_tables).astype(np.int64)
+
+    def table_affinity_matrix(self, assignment, num_tables):
+        """Affinity of every guest with the guests at every table, as a (guests, tables) array."""
+        num_guests = len(self.guests)
+        rows = np.repeat(np.arange(num_guests, dtype=np.int64), np.diff(self.pair_indptr))
+        tables = assignment[self.pair_indices]
+        seated = tables >= 0
+        cells = np.bincount(rows[seated] * num_tables + tables[seated], weights=self.pair_data[seated],
+                            minlength=num_guests * num_tables)
+        return cells.astype(np.int64).reshape(num_guests, num_tables)
+
+    def pair_row(self, guest_id):
+        """Ids of the guests with a non-zero pair score with this guest, and those scores."""
+        start, end = self.pair_indptr[guest_id], self.pair_indptr[guest_id + 1]
+        return self.pair_indices[start:end], self.pair_data[start:end].astype(np.int64)
+
+    def pairs(self, ids1, ids2):
+        """Pair scores of many (guest, other guest) couples at once, element-wise."""
+        if self._pair_keys is None:
+            # Pair entries are sorted by (row, column), so row * n + column is sorted too
+            num_guests = len(self.guests)
+            rows = np.repeat(np.arange(num_guests, dtype=np.int64), np.diff(self.pair_indptr))
+            self._pair_keys = rows * num_guests + self.pair_indices
+        keys = np.asarray(ids1, dtype=np.int64) * len(self.guests) + np.asarray(ids2, dtype=np.int64)
+        if not len(self._pair_keys):
+            return np.zeros(len(keys), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._pair_keys, keys), len(self._pair_keys) - 1)
+        return np.where(self._pair_keys[pos] == keys, self.pair_data[pos], 0).astype(np.int64)
+
+    def top_pair_sums(self, k):
+        """Sum of the k highest positive pair scores of every guest, as an array indexed by guest id."""
+        num_guests = len(self.guests)
+        rows = np.repeat(np.arange(num_guests, dtype=np.int64), np.diff(self.pair_indptr))
+        positive = self.pair_data > 0
+        rows, values = rows[positive], self.pair_data[positive].astype(np.int64)
+        # Highest scores first within each guest's entries, then keep the first k
+        order = np.lexsort((-values, rows))
+        rows, values = rows[order], values[order]
+        counts = np.bincount(rows, minlength=num_guests)
+        rank = np.arange(len(rows)) - (np.cumsum(counts) - counts)[rows]
+        top = rank < k
+        return np.bincount(rows[top], weights=values[top], minlength=num_guests).astype(np.int64)
+
+    def in_table_affinities(self, slots, assignment):
+        """Affinity of every guest with their own tablemates, as an array indexed by guest id."""
+        rows = np.repeat(np.arange(len(self.guests), dtype=np.int32), np.diff(self.pair_indptr))
+        tables = assignment[rows]
+        together = (tables == assignment[self.pair_indices]) & (tables >= 0)
+        return np.bincount(rows[together], weights=self.pair_data[together], minlength=len(self.guests)).astype(np.int64)
+
+    def pair(self, guest_id, other_id):
+        """Score two guests produce when seated together."""
+        return self.pair_list(guest_id, (other_id,))[0]
+
+
+class GuestList(list):
+    """A plain list of guests that also carries the preference backend built for it."""
+
+    def __init__(self, guests, preferences):
+        super().__init__(guests)
+        self.preferences = preferences
+
+
+def choose_backend(num_guests, num_pairs):
+    """
+    Picks the preference backend class for an instance.
+
+    Small events always use the dense matrix. Large ones only do if the matrix
+    fits in DENSE_MAX_BYTES and the preference graph is dense enough to be worth it.
+    """
+    if num_guests <= DENSE_ALWAYS_MAX_GUESTS:
+        return DensePreferences
+    if num_guests * num_guests * np.dtype(np.int32).itemsize > DENSE_MAX_BYTES:
+        return SparsePreferences
+    density = num_pairs / (num_guests * num_guests)
+    return DensePreferences if density >= DENSE_MIN_DENSITY else SparsePreferences
+
+
+def build_preferences(guests, rows, cols, values, backend=None):
+    """
+    Builds a preference backend from (guest id, other guest id, score) triplets.
+
+    Args:
+        guests: Guest objects ordered by id
+        rows, cols, values: Preference triplets; later duplicates of a pair win
+        backend: DensePreferences or SparsePreferences, chosen automatically if None
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int32)
+    # Keep the last score given for every (guest, other guest) pair, like a dict would
+    keys = rows * max(len(guests), 1) + cols
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last
+    rows, cols, values = rows[last], cols[last], values[last]
+
+    if backend is None:
+        backend = choose_backend(len(guests), len(values))
+    return backend.from_triplets(guests, rows, cols, values)
+
+
+def preferences_for(guests):
+    """Returns the preference backend attached to a guest list, building one if needed."""
+    if isinstance(guests, GuestList):
+        return guests.preferences
+    # Guests already bound to a backend that covers exactly this list reuse it
+    stores = {id(guest._store) for guest in guests}
+    store = guests[0]._store if guests else None
+    if len(stores) == 1 and store is not None and len(store) == len(guests):
+        return store
+    guests, rows, cols, values = _triplets_from_guests(guests)
+    return build_preferences(guests, rows, cols, values)
+
+
+def _bind_guests(store):
+    for guest in store.guests:
+        guest._store = store
+
+
+def _triplets_from_guests(guests):
+    """Numbers the guests if needed and lists their preferences as id triplets."""
+    guests = list(guests)
+    ids = [guest.id for guest in guests]
+    if sorted(id_ for id_ in ids if id_ is not None) != list(range(len(guests))):
+        # Ids are missing or do not form 0..n-1, so (re)number the guests
+        for idx, guest in enumerate(guests):
+            guest.id = idx
+    guests.sort(key=lambda guest: guest.id)
+
+    rows, cols, values = [], [], []
+    for guest in guests:
+        for other, score in guest.preferences.items():
+            rows.append(guest.id)
+            cols.append(other.id)
+            values.append(score)
+    return guests, rows, cols, values
+
+
+def _to_csr(num_guests, rows, cols, values):
+    """Sorts triplets by (row, column), sums duplicates and returns indptr, indices, data."""
+    order = np.lexsort((cols, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    if len(rows):
+        # Merge repeated (row, column) entries, e.g. i->j and j->i in the pair matrix
+        starts = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])])
+        values = np.add.reduceat(values.astype(np.int64), starts).astype(np.int32)
+        rows, cols = rows[starts], cols[starts]
+    indptr = np.zeros(num_guests + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_guests), out=indptr[1:])
+    return indptr, cols.astype(np.int32), values
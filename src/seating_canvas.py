@@ -0,0 +1,252 @@
+"""
+Seating plan drawing for the GUI that stays fast on plans with thousands of guests.
+
+Tables sit on a grid in "world" coordinates (CELL units per table, the look of
+the original drawing at zoom 1), and the canvas shows them at the current zoom:
+
+- zoomed out, every table is a single glyph, a square colored by its score
+- zoomed in, tables are drawn in detail, with a seat and a label per guest
+
+Either way only the tables in (or next to) the visible part of the canvas have
+items, so the number of items depends on the window size rather than the plan,
+and scrolling or zooming creates the newly visible tables and drops the rest.
+When a new plan comes in, only the visible tables whose guests or score changed
+are redrawn.
+
+Controls: the scrollbars and mouse wheel scroll, Ctrl + mouse wheel zooms around
+the pointer, and a double click zooms in on the table under the pointer.
+"""
+from math import ceil, cos, sin, pi, sqrt, tanh
+import numpy as np
+
+# World size of a table's grid cell, and of a table and its seats at zoom 1
+CELL = 260
+TABLE_RADIUS = 50
+SEAT_RING = 80
+SEAT_RADIUS = 15
+
+# Tables are drawn in detail once their cell is at least this many pixels wide
+DETAIL_CELL = 120
+# Aggregate glyphs get their table number once their cell is at least this wide
+LABEL_CELL = 40
+
+MIN_ZOOM = 0.01
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.25
+
+
+class SeatingCanvas:
+    """
+    Draws SeatingPlans on a tk.Canvas with level of detail and viewport culling.
+
+    Items of table i carry the tag 't<i>', so a table is redrawn or dropped on
+    its own without touching the others.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.zoom = 1.0
+        self.cols = self.rows = 0
+        self.plan = None
+        self.slots = None         # Copy of the shown plan's slots and table scores,
+        self.table_scores = None  # to find the tables a new plan changes
+        self.detail = None        # Whether the drawn tables are in detail (None: nothing drawn)
+        self.drawn = set()        # Indices of the tables that have items
+        self._render_id = None
+
+        canvas.bind("<Configure>", lambda event: self.schedule_render())
+        canvas.bind("<MouseWheel>", self._on_wheel)
+        canvas.bind("<Button-4>", self._on_wheel)
+        canvas.bind("<Button-5>", self._on_wheel)
+        canvas.bind("<Control-MouseWheel>", self._on_zoom_wheel)
+        canvas.bind("<Control-Button-4>", self._on_zoom_wheel)
+        canvas.bind("<Control-Button-5>", self._on_zoom_wheel)
+        canvas.bind("<Double-Button-1>", self._on_double_click)
+
+    def show(self, plan):
+        """
+        Shows a plan. A plan with the same tables as the shown one keeps the zoom,
+        scroll position and the items of every table it did not change; any other
+        plan gets a new layout, zoomed to fit the window.
+        """
+        slots, table_scores = plan.slots.copy(), plan.table_scores.copy()
+        if self.slots is None or slots.shape != self.slots.shape:
+            self.plan, self.slots, self.table_scores = plan, slots, table_scores
+            self._layout()
+            return
+
+        changed = np.flatnonzero((slots != self.slots).any(axis=1) | (table_scores != self.table_scores))
+        self.plan, self.slots, self.table_scores = plan, slots, table_scores
+        for table_idx in changed.tolist():
+            if table_idx in self.drawn:
+                self.canvas.delete(f"t{table_idx}")
+                self.drawn.discard(table_idx)
+        self.schedule_render()
+
+    def clear(self):
+        self.canvas.delete("all")
+        self.plan = self.slots = self.table_scores = self.detail = None
+        self.drawn.clear()
+
+    def _layout(self):
+        """Places the tables on a grid shaped like the window and zooms to fit it."""
+        self.canvas.delete("all")
+        self.drawn.clear()
+        self.detail = None
+        width, height = self._window_size()
+        num_tables = len(self.slots)
+        self.cols = max(1, min(num_tables, ceil(sqrt(num_tables * width / height))))
+        self.rows = max(1, ceil(num_tables / self.cols))
+        self.zoom = min(1.0, max(MIN_ZOOM, min(width / (self.cols * CELL), height / (self.rows * CELL))))
+        self._update_scrollregion()
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.schedule_render()
+
+    def _window_size(self):
+        # Before the window is mapped Tk reports 1x1 pixels
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return 1200, 1200
+        return width, height
+
+    def _update_scrollregion(self):
+        self.canvas.config(scrollregion=(0, 0, self.cols * CELL * self.zoom, self.rows * CELL * self.zoom))
+
+    # Scrolling and zooming
+
+    def xview(self, *args):
+        """Scrollbar command; scrolls like Canvas.xview, then draws what came into view."""
+        self.canvas.xview(*args)
+        self.schedule_render()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_render()
+
+    def zoom_by(self, factor, x=None, y=None):
+        """
+        Zooms by a factor, keeping the point at window pixel (x, y) in place
+        (the center of the window by default).
+        """
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom * factor))
+        if self.plan is None or zoom == self.zoom:
+            return
+        width, height = self._window_size()
+        x = width / 2 if x is None else x
+        y = height / 2 if y is None else y
+        world_x, world_y = self.canvas.canvasx(x) / self.zoom, self.canvas.canvasy(y) / self.zoom
+
+        # Every coordinate changes, so all items are redrawn (only the visible ones exist)
+        self.canvas.delete("all")
+        self.drawn.clear()
+        self.zoom = zoom
+        self._update_scrollregion()
+        total_width, total_height = self.cols * CELL * zoom, self.rows * CELL * zoom
+        self.canvas.xview_moveto((world_x * zoom - x) / total_width)
+        self.canvas.yview_moveto((world_y * zoom - y) / total_height)
+        self.schedule_render()
+
+    def _on_wheel(self, event):
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.canvas.yview_scroll(-1 if up else 1, "units")
+        self.schedule_render()
+
+    def _on_zoom_wheel(self, event):
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.zoom_by(ZOOM_STEP if up else 1 / ZOOM_STEP, event.x, event.y)
+        return "break"
+
+    def _on_double_click(self, event):
+        # Straight to the detailed view of the table under the pointer
+        if self.zoom * CELL < DETAIL_CELL:
+            self.zoom_by(1.0 / self.zoom, event.x, event.y)
+
+    # Drawing
+
+    def schedule_render(self):
+        """Draws the visible tables once Tk is idle, so bursts of scroll events draw once."""
+        if self._render_id is None:
+            self._render_id = self.canvas.after_idle(self.render)
+
+    def render(self):
+        """Creates the items of the visible tables that have none and drops the items of the others."""
+        self._render_id = None
+        if self.plan is None:
+            return
+        detail = self.zoom * CELL >= DETAIL_CELL
+        if detail != self.detail:
+            self.canvas.delete("all")
+            self.drawn.clear()
+            self.detail = detail
+
+        visible = self.visible_tables()
+        for table_idx in self.drawn - visible:
+            self.canvas.delete(f"t{table_idx}")
+        draw = self._draw_table if detail else self._draw_glyph
+        for table_idx in sorted(visible - self.drawn):
+            draw(table_idx)
+        self.drawn = visible
+
+    def visible_tables(self):
+        """Indices of the tables whose cell is in the visible part of the canvas, or next to it."""
+        width, height = self._window_size()
+        cell = CELL * self.zoom
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        first_col, last_col = max(0, int(left // cell) - 1), min(self.cols - 1, int((left + width) // cell) + 1)
+        first_row, last_row = max(0, int(top // cell) - 1), min(self.rows - 1, int((top + height) // cell) + 1)
+        num_tables = len(self.slots)
+        return {
+            row * self.cols + col
+            for row in range(first_row, last_row + 1)
+            for col in range(first_col, last_col + 1)
+            if row * self.cols + col < num_tables
+        }
+
+    def _center(self, table_idx):
+        row, col = divmod(table_idx, self.cols)
+        return (col + 0.5) * CELL * self.zoom, (row + 0.5) * CELL * self.zoom
+
+    def _draw_glyph(self, table_idx):
+        """Zoomed out: one square per table, colored by how much its guests like each other."""
+        x, y = self._center(table_idx)
+        half = 0.4 * CELL * self.zoom
+        tag = f"t{table_idx}"
+        self.canvas.create_rectangle(x - half, y - half, x + half, y + half, fill=self._glyph_color(table_idx),
+                                     outline="black" if half >= 4 else "", tags=tag)
+        if CELL * self.zoom >= LABEL_CELL:
+            self.canvas.create_text(x, y, text=str(table_idx + 1), font=("Arial", 8, "bold"), fill="black", tags=tag)
+
+    def _glyph_color(self, table_idx):
+        """Grey for empty tables, else white to green (liked) or white to red (disliked) by score per guest."""
+        guest_ids = self.slots[table_idx]
+        count = int((guest_ids >= 0).sum())
+        if count == 0:
+            return "#adb5bd"
+        strength = tanh(abs(int(self.table_scores[table_idx])) / count / 5)
+        fade = int(255 * (1 - strength))
+        if self.table_scores[table_idx] >= 0:
+            return f"#{fade:02x}{max(fade, 160):02x}{fade:02x}"
+        return f"#{max(fade, 200):02x}{fade:02x}{fade:02x}"
+
+    def _draw_table(self, table_idx):
+        """Zoomed in: the table and a numbered seat per guest, as in the original drawing."""
+        x, y = self._center(table_idx)
+        zoom = self.zoom
+        tag = f"t{table_idx}"
+        radius = TABLE_RADIUS * zoom
+        self.canvas.create_oval(x - radius, y - radius, x + radius, y + radius,
+                                fill="#FF6347", outline="black", width=2, tags=tag)
+        self.canvas.create_text(x, y, text=f"Table {table_idx + 1}", font=("Arial", 10, "bold"), fill="white", tags=tag)
+
+        guests_by_id = self.plan.preferences.guests
+        guest_ids = [guest_id for guest_id in self.slots[table_idx].tolist() if guest_id >= 0]
+        ring, seat = SEAT_RING * zoom, SEAT_RADIUS * zoom
+        for j, guest_id in enumerate(guest_ids):
+            angle = 2 * pi * j / len(guest_ids)
+            guest_x = x + ring * cos(angle)
+            guest_y = y + ring * sin(angle)
+            guest_number = ''.join(filter(str.isdigit, guests_by_id[guest_id].name))
+            self.canvas.create_oval(guest_x - seat, guest_y - seat, guest_x + seat, guest_y + seat,
+                                    fill="#87CEEB", outline="black", tags=tag)
+            self.canvas.create_text(guest_x, guest_y, text=guest_number, font=("Arial", 8, "bold"), fill="black", tags=tag)
@@ -1,13 +1,49 @@
+import numpy as np
+import metrics
+from preferences import GuestList, preferences_for
+
+# Seed of the random per-guest keys behind SeatingPlan.plan_key(), fixed so keys
+# are the same in every process
+PLAN_HASH_SEED = 0x5EA7
+# Tables with at most this many guests are updated and scored with plain Python
+# loops over their members; a few NumPy calls cost more than such a loop, so the
+# vectorized code only pays off for larger tables
+SMALL_TABLE_SIZE = 32
+MASK64 = (1 << 64) - 1
+
 class Guest:
-    def __init__(self, name):
+    """
+    A guest of the event.
+
+    Once a preference backend is built for the guest list, the guest becomes a thin
+    view on it: preferences are read from (and written to) the backend by guest id.
+    """
+
+    def __init__(self, name, guest_id=None):
         self.name = name
-        self.preferences = {}  # Dictionary of guest -> preference score
+        self.id = guest_id  # Index of this guest in the preference backend
+        self._preferences = {}  # Dictionary of guest -> preference score, until bound to a backend
+        self._store = None
+
+    @property
+    def preferences(self):
+        """Dictionary of guest -> preference score."""
+        if self._store is None:
+            return self._preferences
+        guests_by_id = self._store.guests
+        ids, scores = self._store.row(self.id)
+        return {guests_by_id[other_id]: score for other_id, score in zip(ids.tolist(), scores.tolist())}
 
     def set_preference(self, other_guest, score):
-        self.preferences[other_guest] = score
+        if self._store is None:
+            self._preferences[other_guest] = score
+        else:
+            self._store.set(self.id, other_guest.id, score)
 
     def get_preference(self, other_guest):
-        return self.preferences.get(other_guest, 0)
+        if self._store is None:
+            return self._preferences.get(other_guest, 0)
+        return self._store.get(self.id, other_guest.id)
 
     def __repr__(self):
         return self.name
@@ -16,16 +52,27 @@ class Table:
     def __init__(self, capacity):
         self.capacity = capacity
         self.guests = []
+        self._seats = {}  # Guest -> index in self.guests, for constant-time lookups
 
     def add_guest(self, guest):
         if len(self.guests) < self.capacity:
+            self._seats[guest] = len(self.guests)
             self.guests.append(guest)
             return True
         return False
 
     def remove_guest(self, guest):
-        if guest in self.guests:
-            self.guests.remove(guest)
+        seat = self._seats.pop(guest, None)
+        if seat is None:
+            return
+        # Move the last guest into the freed seat instead of shifting the whole list
+        last = self.guests.pop()
+        if seat < len(self.guests):
+            self.guests[seat] = last
+            self._seats[last] = seat
+
+    def __contains__(self, guest):
+        return guest in self._seats
 
     def is_full(self):
         return len(self.guests) >= self.capacity
@@ -33,61 +80,368 @@ class Table:
     def __repr__(self):
         return f"Table({self.guests})"
     
+class TableView:
+    """
+    Table-like view of one row of a SeatingPlan's slot array.
+
+    Offers the same interface as Table (guests, capacity, add_guest, remove_guest,
+    is_full) so code written against lists of Table objects keeps working, while
+    the data itself stays in the plan's arrays.
+    """
+
+    def __init__(self, plan, index):
+        self._plan = plan
+        self.index = index
+
+    @property
+    def capacity(self):
+        return self._plan.table_capacity
+
+    @property
+    def guests(self):
+        plan = self._plan
+        guests_by_id = plan.preferences.guests
+        return [guests_by_id[guest_id] for guest_id in plan.slots[self.index, :plan.counts[self.index]].tolist()]
+
+    @guests.setter
+    def guests(self, guests):
+        self._plan._set_table(self.index, [guest.id for guest in guests])
+
+    def add_guest(self, guest):
+        return self._plan.add_guest(guest, self.index)
+
+    def remove_guest(self, guest):
+        self._plan._remove_from_table(guest.id, self.index)
+
+    def __contains__(self, guest):
+        return self._plan.assignment[guest.id] == self.index
+
+    def is_full(self):
+        return self._plan.counts[self.index] >= self._plan.table_capacity
+
+    def __len__(self):
+        return int(self._plan.counts[self.index])
+
+    def __repr__(self):
+        return f"Table({self.guests})"
+
+
 class SeatingPlan:
+    """
+    Seating plan stored as compact arrays indexed by guest id:
+
+    - assignment[guest_id] is the table the guest sits at (-1 if not seated)
+    - slots[table_idx, :counts[table_idx]] are the ids of the guests at a table,
+      the remaining seats of the row hold -1
+    - position[guest_id] is the guest's seat in that row (-1 if not seated), so
+      finding, removing and moving a guest never scans a table
+
+    Scores are cached and kept up to date by every change to the plan:
+
+    - table_scores[table_idx] is the preference score of one table
+    - guest_affinity[guest_id] is the score a guest exchanges with their tablemates
+    - table_hashes[table_idx] is the sum of the random keys of a table's guests,
+      from which plan_key() is derived
+
+    `tables` exposes the same data as a list of Table-like views.
+    """
+
     def __init__(self, guests, num_tables, table_capacity):
-        self.tables = [Table(table_capacity) for _ in range(num_tables)]
-        self.guest_list = guests
+        self._init_arrays(guests, num_tables, table_capacity)
         self.assign_guests_randomly()
 
+    def _init_arrays(self, guests, num_tables, table_capacity):
+        if not isinstance(guests, GuestList):
+            # Attach the preference backend so plans derived from this one reuse it
+            guests = GuestList(guests, preferences_for(guests))
+        self.guest_list = guests
+        self.preferences = guests.preferences
+        self.num_tables = num_tables
+        self.table_capacity = table_capacity
+        self.assignment = np.full(len(self.preferences), -1, dtype=np.int32)
+        self.position = np.full(len(self.preferences), -1, dtype=np.int32)
+        self.slots = np.full((num_tables, table_capacity), -1, dtype=np.int32)
+        self.counts = np.zeros(num_tables, dtype=np.int32)
+        self.table_scores = np.zeros(num_tables, dtype=np.int64)
+        self.guest_affinity = np.zeros(len(self.preferences), dtype=np.int64)
+        self.hash_keys = _guest_hash_keys(self.preferences)
+        self.table_hashes = np.zeros(num_tables, dtype=np.uint64)
+        self._tables = None
+
+    @classmethod
+    def empty(cls, guests, num_tables, table_capacity):
+        """Creates a plan with every table empty and no guest seated."""
+        plan = cls.__new__(cls)
+        plan._init_arrays(guests, num_tables, table_capacity)
+        return plan
+
+    @classmethod
+    def from_assignment(cls, guests, assignment, num_tables, table_capacity):
+        """
+        Creates a plan from a guest -> table array.
+
+        Args:
+            guests: Guest list of the instance
+            assignment: Table index for every guest id (-1 leaves the guest unseated)
+            num_tables: Number of tables
+            table_capacity: Seats per table
+
+        Returns:
+            SeatingPlan: The new plan
+
+        Raises:
+            ValueError: If a table would receive more guests than its capacity
+        """
+        plan = cls.empty(guests, num_tables, table_capacity)
+        assignment = np.asarray(assignment, dtype=np.int32)
+        seated = np.flatnonzero(assignment >= 0)
+        tables = assignment[seated]
+        counts = np.bincount(tables, minlength=num_tables)
+        if counts.max(initial=0) > table_capacity:
+            raise ValueError("Assignment seats more guests at a table than its capacity allows.")
+
+        # Group the seated guests by table and give each one the next free seat
+        order = np.argsort(tables, kind='stable')
+        seated, tables = seated[order], tables[order]
+        first_seat = np.cumsum(counts) - counts
+        seats = np.arange(len(seated)) - first_seat[tables]
+
+        plan.assignment[:] = assignment
+        plan.position[seated] = seats
+        plan.slots[tables, seats] = seated
+        plan.counts[:] = counts
+        plan.recompute_scores()
+        return plan
+
+    @property
+    def tables(self):
+        # Views are stateless wrappers, so they are created once per plan and only when needed
+        if self._tables is None:
+            self._tables = [TableView(self, i) for i in range(self.num_tables)]
+        return self._tables
+
     def assign_guests_randomly(self):
+        """Fills the tables one after the other with the guests in random order."""
         import random
-        random.shuffle(self.guest_list)
-        table_idx = 0
-        for guest in self.guest_list:
-            while not self.tables[table_idx].add_guest(guest):
-                table_idx = (table_idx + 1) % len(self.tables)  # Move to the next table
+        num_guests = len(self.preferences)
+        if num_guests > self.num_tables * self.table_capacity:
+            raise ValueError("Not enough seats for all guests. Consider increasing table capacity or number of tables.")
+
+        # Shuffle guest ids rather than the shared guest list
+        order = list(range(num_guests))
+        random.shuffle(order)
+        order = np.array(order, dtype=np.int32)
+
+        self.slots.fill(-1)
+        self.slots.reshape(-1)[:num_guests] = order
+        self.assignment[order] = np.arange(num_guests, dtype=np.int32) // self.table_capacity
+        self.position[order] = np.arange(num_guests, dtype=np.int32) % self.table_capacity
+        self.counts[:] = np.clip(num_guests - np.arange(self.num_tables) * self.table_capacity, 0, self.table_capacity)
+        self.recompute_scores()
+
+    def recompute_scores(self):
+        """Rebuilds the per-table score and per-guest affinity caches from scratch."""
+        self.guest_affinity = self.preferences.in_table_affinities(self.slots, self.assignment)
+        # Every pair at a table is counted once from each side in the guest affinities
+        seated = self.assignment >= 0
+        self.table_scores = np.bincount(
+            self.assignment[seated], weights=self.guest_affinity[seated], minlength=self.num_tables
+        ).astype(np.int64) // 2
+        occupied = self.slots >= 0
+        self.table_hashes = np.where(occupied, self.hash_keys[np.where(occupied, self.slots, 0)], 0).sum(
+            axis=1, dtype=np.uint64)
 
     def score(self):
         """Calculates the total preference score of the seating plan."""
-        total_score = 0
-        for table in self.tables:
-            for guest in table.guests:
-                for other in table.guests:
-                    if guest != other:
-                        total_score += guest.get_preference(other)
-        return total_score
+        active = metrics.current()
+        if active is not None:
+            active.count('score_calls')
+        return int(self.table_scores.sum())
+
+    def plan_key(self):
+        """
+        64-bit hash of who sits with whom, for memoizing plan evaluations.
+
+        Seat order and table order do not matter: a table hash is the wrapping sum of
+        its guests' random keys, and the plan key the wrapping sum of the mixed table
+        hashes. Both sums are order-independent and table_hashes is kept up to date by
+        every change, so this costs O(tables). Different plans collide with
+        probability about 2^-64.
+        """
+        return int(_mix64(self.table_hashes).sum(dtype=np.uint64))
 
     def swap_guests(self, table1_idx, table2_idx):
         """Swaps a guest between two tables."""
         import random
-        if not self.tables[table1_idx].guests or not self.tables[table2_idx].guests:
+        if not self.counts[table1_idx] or not self.counts[table2_idx]:
             return
-        g1 = random.choice(self.tables[table1_idx].guests)
-        g2 = random.choice(self.tables[table2_idx].guests)
-        self.tables[table1_idx].remove_guest(g1)
-        self.tables[table2_idx].remove_guest(g2)
-        self.tables[table1_idx].add_guest(g2)
-        self.tables[table2_idx].add_guest(g1)
+        guests_by_id = self.preferences.guests
+        g1 = guests_by_id[random.choice(self._member_ids(table1_idx).tolist())]
+        g2 = guests_by_id[random.choice(self._member_ids(table2_idx).tolist())]
+        self.swap(g1, g2)
+
+    def swap(self, guest1, guest2):
+        """Swaps two guests sitting at different tables."""
+        table1_idx = self.assignment.item(guest1.id)
+        table2_idx = self.assignment.item(guest2.id)
+        self._remove_from_table(guest1.id, table1_idx)
+        self._remove_from_table(guest2.id, table2_idx)
+        self._seat(guest2.id, table1_idx)
+        self._seat(guest1.id, table2_idx)
+
+    def add_guest(self, guest, table_idx):
+        """Seats a guest at a table. Returns False if the table is full."""
+        if self.counts.item(table_idx) >= self.table_capacity:
+            return False
+        self._seat(guest.id, table_idx)
+        return True
+
+    def _seat(self, guest_id, table_idx):
+        """Puts a guest in the next free seat of a table and updates the score caches."""
+        count = self.counts.item(table_idx)
+        total = self._exchange(guest_id, table_idx, count, 1)
+        self.guest_affinity[guest_id] = total
+        self.table_scores[table_idx] += total
+        self.table_hashes[table_idx] = (self.table_hashes.item(table_idx) + self.hash_keys.item(guest_id)) & MASK64
+
+        self.slots[table_idx, count] = guest_id
+        self.counts[table_idx] = count + 1
+        self.assignment[guest_id] = table_idx
+        self.position[guest_id] = count
+
+    def remove_guest(self, guest):
+        """Removes a guest from whichever table they are sitting at."""
+        table_idx = self.assignment[guest.id]
+        if table_idx >= 0:
+            self._remove_from_table(guest.id, table_idx)
+
+    def _remove_from_table(self, guest_id, table_idx):
+        slots = self.slots
+        count = self.counts.item(table_idx)
+        if self.assignment.item(guest_id) == table_idx:
+            seat = self.position.item(guest_id)
+            self.assignment[guest_id] = -1
+            self.position[guest_id] = -1
+        else:
+            # Only plans edited through Table.guests can list a guest at a table
+            # other than their assigned one; fall back to a scan of the row
+            seats = np.flatnonzero(slots[table_idx, :count] == guest_id)
+            if not len(seats):
+                return
+            seat = int(seats[0])
+        # Fill the hole with the last guest of the row so seats stay contiguous
+        last = count - 1
+        moved = slots.item(table_idx, last)
+        slots[table_idx, seat] = moved
+        slots[table_idx, last] = -1
+        self.counts[table_idx] = last
+        if moved != guest_id and self.assignment.item(moved) == table_idx:
+            self.position[moved] = seat
+
+        # The guest's tablemates lose what they exchanged with them
+        lost = self._exchange(guest_id, table_idx, last, -1)
+        self.guest_affinity[guest_id] = 0
+        self.table_scores[table_idx] -= lost
+        self.table_hashes[table_idx] = (self.table_hashes.item(table_idx) - self.hash_keys.item(guest_id)) & MASK64
+
+    def _exchange(self, guest_id, table_idx, count, sign):
+        """
+        Adds (sign 1) or takes away (sign -1) what a guest exchanges with the first
+        count guests of a table to those guests' cached affinities. Returns the total.
+        """
+        if count <= SMALL_TABLE_SIZE:
+            members = self.slots[table_idx, :count].tolist()
+            affinity = self.guest_affinity
+            total = 0
+            for member, value in zip(members, self.preferences.pair_list(guest_id, members)):
+                if value:
+                    affinity[member] += sign * value
+                    total += value
+            return total
+        members = self.slots[table_idx, :count]
+        values = self.preferences.pair_values(guest_id, members)
+        self.guest_affinity[members] += sign * values
+        return int(values.sum())
+
+    def _affinity(self, guest_id, table_idx):
+        """Score a guest exchanges with the guests at a table, without changing the plan."""
+        count = self.counts.item(table_idx)
+        if count <= SMALL_TABLE_SIZE:
+            return sum(self.preferences.pair_list(guest_id, self.slots[table_idx, :count].tolist()))
+        return self.preferences.affinity(guest_id, self.slots[table_idx, :count])
+
+    def _set_table(self, table_idx, guest_ids):
+        """Replaces every guest at a table, as assigning to Table.guests used to."""
+        for guest_id in self._member_ids(table_idx).tolist():
+            if self.assignment[guest_id] == table_idx:
+                self.assignment[guest_id] = -1
+                self.position[guest_id] = -1
+        self.slots[table_idx] = -1
+        self.slots[table_idx, :len(guest_ids)] = guest_ids
+        self.counts[table_idx] = len(guest_ids)
+        self.assignment[guest_ids] = table_idx
+        self.position[guest_ids] = np.arange(len(guest_ids), dtype=np.int32)
+
+        prefs = self.preferences
+        affinities = [prefs.affinity(guest_id, guest_ids) for guest_id in guest_ids]
+        self.guest_affinity[guest_ids] = affinities
+        self.table_scores[table_idx] = sum(affinities) // 2
+        self.table_hashes[table_idx] = self.hash_keys[guest_ids].sum(dtype=np.uint64)
+
+    def _member_ids(self, table_idx):
+        return self.slots[table_idx, :self.counts[table_idx]]
+
+    def table_of(self, guest):
+        """Index of the table a guest sits at, or -1 if they are not seated."""
+        return self.assignment.item(guest.id)
+
+    def delta_swap(self, guest1, guest2):
+        """
+        Score change that swapping two guests would cause, without changing the plan.
+
+        Only the two affected tables are looked at, so this costs O(table size)
+        instead of the O(tables * capacity^2) of rescoring the whole plan.
+        """
+        table1_idx = self.assignment.item(guest1.id)
+        table2_idx = self.assignment.item(guest2.id)
+        if table1_idx == table2_idx:
+            return 0
+        # Each guest trades their current tablemates (whose affinity is cached) for the
+        # other guest's tablemates. The affinities to the new table include the swapped
+        # partner, who leaves.
+        return (self._affinity(guest1.id, table2_idx) - self.guest_affinity.item(guest1.id)
+                + self._affinity(guest2.id, table1_idx) - self.guest_affinity.item(guest2.id)
+                - 2 * self.preferences.pair(guest1.id, guest2.id))
+
+    def delta_move(self, guest, to_table_idx):
+        """Score change that moving a guest to another table would cause, without changing the plan."""
+        from_table_idx = self.assignment.item(guest.id)
+        if from_table_idx == to_table_idx:
+            return 0
+        return self._affinity(guest.id, to_table_idx) - self.guest_affinity.item(guest.id)
 
     def __repr__(self):
         return "\n".join(str(table) for table in self.tables)
     
     def copy(self):
-        """Creates a deep copy of the current seating plan."""
-        import copy
-        
-        # Create a new empty seating plan with the same parameters
-        new_plan = SeatingPlan(self.guest_list, len(self.tables), self.tables[0].capacity)
-        
-        # Clear the random assignment that was done in the constructor
-        for table in new_plan.tables:
-            table.guests = []
-        
-        # Copy each guest to the same table they were in the original plan
-        for i, table in enumerate(self.tables):
-            for guest in table.guests:
-                new_plan.tables[i].add_guest(guest)
-        
+        """Creates a copy of the current seating plan by copying its arrays."""
+        active = metrics.current()
+        if active is not None:
+            active.count('plan_copies')
+        new_plan = type(self).__new__(type(self))
+        new_plan.guest_list = self.guest_list
+        new_plan.preferences = self.preferences
+        new_plan.num_tables = self.num_tables
+        new_plan.table_capacity = self.table_capacity
+        new_plan.assignment = self.assignment.copy()
+        new_plan.position = self.position.copy()
+        new_plan.slots = self.slots.copy()
+        new_plan.counts = self.counts.copy()
+        new_plan.table_scores = self.table_scores.copy()
+        new_plan.guest_affinity = self.guest_affinity.copy()
+        new_plan.hash_keys = self.hash_keys
+        new_plan.table_hashes = self.table_hashes.copy()
+        new_plan._tables = None
         return new_plan
     
     def move_guest(self, guest, from_table_idx, to_table_idx):
@@ -103,22 +457,125 @@ class SeatingPlan:
             bool: True if move was successful, False otherwise
         """
         # Check if the guest is at the from_table
-        if guest not in self.tables[from_table_idx].guests:
+        if self.assignment.item(guest.id) != from_table_idx:
             return False
         
         # Check if the to_table has capacity
-        if self.tables[to_table_idx].is_full():
+        if self.counts.item(to_table_idx) >= self.table_capacity:
             return False
         
-        # Remove guest from the source table
-        self.tables[from_table_idx].remove_guest(guest)
-        
-        # Add guest to the destination table
-        result = self.tables[to_table_idx].add_guest(guest)
-        
-        # If add_guest failed for some reason, put guest back in original table
-        if not result:
-            self.tables[from_table_idx].add_guest(guest)
+        # Remove guest from the source table and add them to the destination table
+        self._remove_from_table(guest.id, from_table_idx)
+        self._seat(guest.id, to_table_idx)
+        return True
+
+    def worst_table(self):
+        """
+        Index of the table with the lowest average preference per pair of guests,
+        among tables with at least two guests (None if there is none).
+        Read from the score cache, so no table is rescored.
+        """
+        counts = self.counts.astype(np.int64)
+        candidates = np.flatnonzero(counts >= 2)
+        if not len(candidates):
+            return None
+        averages = self.table_scores[candidates] / (counts[candidates] * (counts[candidates] - 1))
+        return int(candidates[np.argmin(averages)])
+
+    def worst_guest(self, table_idx):
+        """Guest at a table who exchanges the least score with their tablemates."""
+        members = self._member_ids(table_idx)
+        return self.preferences.guests[int(members[np.argmin(self.guest_affinity[members])])]
+
+    def table_affinities(self, guest):
+        """Score a guest would exchange with the guests of every table, as an array indexed by table."""
+        return self.preferences.table_affinities(guest.id, self.assignment, self.num_tables)
+
+
+def _guest_hash_keys(preferences):
+    """Random 64-bit key of every guest, created once per preference backend."""
+    keys = getattr(preferences, '_hash_keys', None)
+    if keys is None or len(keys) != len(preferences):
+        keys = np.random.default_rng(PLAN_HASH_SEED).bit_generator.random_raw(len(preferences))
+        preferences._hash_keys = keys
+    return keys
+
+
+def _mix64(values):
+    """SplitMix64 finalizer over a uint64 array, so sums of mixed values do not cancel out."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class MoveJournal:
+    """
+    Applies changes to a SeatingPlan in place while recording how to undo them.
+
+    Every change also adds its exact score delta to `delta`, so the caller knows
+    the new score without rescoring the plan. `undo()` restores the plan to the
+    state it had at the last `commit()`; `commit()` keeps the changes.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.entries = []  # ('swap', guest1, guest2) or ('seat', guest, previous_table_idx)
+        self.delta = 0
+
+    def swap(self, guest1, guest2):
+        """Swaps two guests at different tables."""
+        plan = self.plan
+        scores = plan.table_scores
+        table1_idx, table2_idx = plan.table_of(guest1), plan.table_of(guest2)
+        # The plan's score cache already holds the effect of the change
+        before = scores.item(table1_idx) + scores.item(table2_idx)
+        plan.swap(guest1, guest2)
+        self.delta += scores.item(table1_idx) + scores.item(table2_idx) - before
+        self.entries.append(('swap', guest1, guest2))
+
+    def move(self, guest, to_table_idx):
+        """Moves a guest to another table. Returns False if that table is full."""
+        plan = self.plan
+        from_table_idx = plan.table_of(guest)
+        before = plan.guest_affinity.item(guest.id)
+        if not plan.move_guest(guest, from_table_idx, to_table_idx):
             return False
-            
-        return True
\ No newline at end of file
+        self.delta += plan.guest_affinity.item(guest.id) - before
+        self.entries.append(('seat', guest, from_table_idx))
+        return True
+
+    def remove(self, guest):
+        """Takes a guest off their table, leaving them unseated."""
+        plan = self.plan
+        table_idx = plan.table_of(guest)
+        self.delta -= int(plan.guest_affinity[guest.id])
+        plan.remove_guest(guest)
+        self.entries.append(('seat', guest, table_idx))
+
+    def add(self, guest, table_idx):
+        """Seats an unseated guest. Returns False if the table is full."""
+        plan = self.plan
+        if not plan.add_guest(guest, table_idx):
+            return False
+        self.delta += int(plan.guest_affinity[guest.id])
+        self.entries.append(('seat', guest, -1))
+        return True
+
+    def undo(self):
+        """Reverts every change since the last commit."""
+        plan = self.plan
+        for kind, guest, other in reversed(self.entries):
+            if kind == 'swap':
+                plan.swap(guest, other)
+            else:
+                plan.remove_guest(guest)
+                if other >= 0:
+                    plan.add_guest(guest, other)
+        self.commit()
+
+    def commit(self):
+        """Keeps the changes and starts a new, empty journal."""
+        self.entries.clear()
+        self.delta = 0
@@ -0,0 +1,115 @@
+import uuid
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from seating_plan import Guest
+from preferences import GuestList, DensePreferences, SparsePreferences
+
+BACKENDS = {
+    'dense': DensePreferences,
+    'sparse': SparsePreferences,
+}
+
+# Instances already attached in this process, by handle token. Keeping the
+# SharedMemory objects referenced here also keeps their buffers mapped.
+_attached = {}
+
+
+class SharedInstanceHandle:
+    """
+    Small, picklable description of an instance published in shared memory.
+
+    This is what gets sent to worker processes instead of the Guest objects and
+    their preferences; workers turn it back into guests with attach().
+    """
+
+    def __init__(self, token, backend, names, arrays):
+        self.token = token
+        self.backend = backend  # Key of BACKENDS
+        self.names = names  # Guest names, indexed by guest id
+        self.arrays = arrays  # Array name -> (shared memory name, shape, dtype string)
+
+
+class SharedInstance:
+    """
+    Publishes the preference data of a guest list in shared memory, once.
+
+    Worker processes attach to it without copying the preference arrays. The
+    publishing process owns the memory: call close() (or use it as a context
+    manager) when every worker is done.
+
+    Example:
+        with SharedInstance(guests) as shared:
+            pool.map(work, [shared.handle] * n)
+    """
+
+    def __init__(self, guests):
+        store = guests.preferences
+        backend = next(key for key, cls in BACKENDS.items() if isinstance(store, cls))
+        self._blocks = []
+        arrays = {}
+        for name, array in store.to_arrays().items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        names = [guest.name for guest in store.guests]
+        self.handle = SharedInstanceHandle(uuid.uuid4().hex, backend, names, arrays)
+
+    def close(self):
+        """Releases the shared memory. Workers must not use the instance afterwards."""
+        _attached.pop(self.handle.token, None)
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open_block(name):
+    """Opens an existing shared memory block without making this process its owner."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 has no track argument. Skip the registration with the resource
+    # tracker, which is shared with the publisher and would otherwise unlink its
+    # memory (or complain about it) when this process exits.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach(handle):
+    """
+    Rebuilds the guest list of a shared instance on top of the shared arrays.
+
+    Arrays are not copied, and repeated calls with the same handle in one process
+    return the same guests. Seating plans are then built as usual, e.g. with
+    SeatingPlan.from_assignment(guests, assignment, num_tables, table_capacity).
+
+    Returns:
+        GuestList: The guests, carrying a preference backend backed by shared memory
+    """
+    if handle.token in _attached:
+        return _attached[handle.token][0]
+
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in handle.arrays.items():
+        block = _open_block(block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    guests = [Guest(name, idx) for idx, name in enumerate(handle.names)]
+    guests = GuestList(guests, BACKENDS[handle.backend].from_arrays(guests, arrays))
+    _attached[handle.token] = (guests, blocks)
+    return guests
@@ -0,0 +1,53 @@
+import numpy as np
+from seating_plan import Guest
+from preferences import GuestList, build_preferences
+
+
+def generate_instance(num_guests, avg_preferences=10, positive_share=0.7, group_size=8, group_share=0.5,
+                      max_score=10, seed=0, backend=None):
+    """
+    Generates a random guest list with preferences, reproducibly from a seed.
+
+    Guests are split into hidden groups (families, friend circles) so that good
+    plans exist and can be found: a share of every guest's preferences go to their
+    own group and are always positive, the rest go to any guest and are positive or
+    negative according to positive_share.
+
+    Args:
+        num_guests: Number of guests
+        avg_preferences: Average number of preferences each guest expresses (the density)
+        positive_share: Share of positive scores among the preferences outside a guest's group
+        group_size: Size of the hidden groups
+        group_share: Share of the preferences that go to the guest's own group
+        max_score: Scores are drawn from 1..max_score, then given their sign
+        seed: Seed of the random generator
+        backend: DensePreferences or SparsePreferences, chosen automatically if None
+
+    Returns:
+        GuestList: Guests named Guest0, Guest1, ... carrying their preference backend
+    """
+    rng = np.random.default_rng(seed)
+    num_preferences = int(round(num_guests * avg_preferences))
+    rows = rng.integers(num_guests, size=num_preferences)
+
+    # Hidden groups over a random permutation, so guest ids say nothing about them
+    group = rng.permutation(num_guests) // max(group_size, 1)
+    members = np.argsort(group, kind='stable')
+    group_counts = np.bincount(group)
+    group_start = np.cumsum(group_counts) - group_counts
+    row_groups = group[rows]
+    in_group = rng.random(num_preferences) < group_share
+    cols = np.where(
+        in_group,
+        members[group_start[row_groups] + (rng.random(num_preferences) * group_counts[row_groups]).astype(np.int64)],
+        rng.integers(num_guests, size=num_preferences),
+    )
+
+    scores = rng.integers(1, max_score + 1, size=num_preferences)
+    negative = ~in_group & (rng.random(num_preferences) >= positive_share)
+    scores[negative] *= -1
+
+    # Guests have no preference about themselves
+    keep = rows != cols
+    guests = [Guest(f"Guest{idx}", idx) for idx in range(num_guests)]
+    return GuestList(guests, build_preferences(guests, rows[keep], cols[keep], scores[keep], backend))
@@ -1,25 +1,60 @@
 import csv
 import re  # Import regex for extracting numeric parts
 from seating_plan import Guest
+from preferences import GuestList, build_preferences
 
-def read_input_csv(file_path):
-    guests = {}
-    with open(file_path, mode='r') as file:
-        reader = csv.DictReader(file)
+def parse_preferences_csv(file_path):
+    """
+    Parses a preferences CSV file into guest names and id triplets.
+
+    Returns:
+        tuple: (names, rows, cols, values) where names[i] is the name of the guest with
+               id i and each (rows[k], cols[k], values[k]) is one preference row
+    """
+    non_digits = re.compile(r'\D')
+    ids = {}
+    rows, cols, values = [], [], []
+    with open(file_path, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        guest_col = header.index('Guest')
+        other_col = header.index('Preference_Guest')
+        score_col = header.index('Preference_Score')
         for row in reader:
+            if not row:
+                continue
             # Extract numeric part of guest names
-            guest_name = ''.join(filter(str.isdigit, row['Guest']))
-            other_guest_name = ''.join(filter(str.isdigit, row['Preference_Guest']))
-            preference_score = int(row['Preference_Score'])
-            
-            if guest_name not in guests:
-                guests[guest_name] = Guest(guest_name)
-            if other_guest_name not in guests:
-                guests[other_guest_name] = Guest(other_guest_name)
-            
-            guests[guest_name].set_preference(guests[other_guest_name], preference_score)
-    
-    return list(guests.values())
+            guest_name = non_digits.sub('', row[guest_col])
+            other_guest_name = non_digits.sub('', row[other_col])
+
+            # Guests get consecutive integer ids in order of first appearance
+            rows.append(ids.setdefault(guest_name, len(ids)))
+            cols.append(ids.setdefault(other_guest_name, len(ids)))
+            values.append(int(row[score_col]))
+    return list(ids), rows, cols, values
+
+def read_input_csv(file_path, backend=None, use_cache=True):
+    """
+    Reads the guests and their preferences from a CSV file.
+
+    Preferences go straight into a preference backend (dense matrix or sparse CSR,
+    picked from the guest count and density unless `backend` is given) instead of
+    per-guest dictionaries. Returns a GuestList carrying that backend.
+
+    With use_cache, the file is compiled once into a binary cache in the user's
+    cache directory and later calls memory-map that cache instead of parsing the
+    CSV again.
+    """
+    if use_cache:
+        from instance_cache import load_instance
+        try:
+            return load_instance(file_path, backend)
+        except OSError:
+            pass  # The cache cannot be written here, so just parse the file
+
+    names, rows, cols, values = parse_preferences_csv(file_path)
+    guest_list = [Guest(name, idx) for idx, name in enumerate(names)]
+    return GuestList(guest_list, build_preferences(guest_list, rows, cols, values, backend))
 
 def write_output_csv(file_path, results):
     with open(file_path, mode='w', newline='') as file: